@@ -5,8 +5,9 @@ __date__ = "August 2022"
 
 import tkinter as tk
 from tkinter import filedialog
-import sys, getopt
+import sys, os, getopt
 from snakes import SnakeGame
+import replay
 
 def main(argv):
     # Load the defaults
@@ -14,13 +15,17 @@ def main(argv):
 
     # Check of arguments from command line
     try:
-        opts, args = getopt.getopt(argv, "r:f:l:",["res=", "fast=", "load="])
+        opts, args = getopt.getopt(argv, "r:f:l:cbp:g:",["res=", "fast=", "load=", "catalog", "rebuild", "player=", "game="])
     except getopt.GetoptError:
         print("Error! Invalid argument.")
         sys.exit(2)
 
     # Process command line arguments
     loadGame = None
+    listCatalog = False
+    rebuildCatalog = False
+    catalogPlayer = None
+    catalogGame = None
     for opt, arg in opts:
         if opt in ("-r", "--res"):
             res = arg.split('x')
@@ -35,19 +40,54 @@ def main(argv):
         elif opt in ("-l", "--load"):
             loadGame = arg
 
+        elif opt in ("-c", "--catalog"):
+            listCatalog = True
+
+        elif opt in ("-b", "--rebuild"):
+            rebuildCatalog = True
+
+        elif opt in ("-p", "--player"):
+            catalogPlayer = arg
+
+        elif opt in ("-g", "--game"):
+            catalogGame = int(arg)
+
     if game_settings['visSpeed'] != 'normal' and game_settings['visSpeed'] != 'fast' and game_settings['visSpeed'] != 'slow':
         print("Error! Invalid setting '%s' for visualisation speed.  Valid choices are 'slow','normal',fast'" % game_settings['visSpeed'])
         sys.exit(-1)
 
+    # Rebuild the catalog from the games in the saved folder, then list them
+    if rebuildCatalog:
+        replay.rebuild_catalog("saved")
+        listCatalog = True
+
+    # List the saved games from the catalog, optionally only the games of one player,
+    # or pick one of them by its number in the list
+    if listCatalog or catalogGame is not None:
+        entries = replay.read_catalog("saved", player=catalogPlayer)
+
+        if catalogGame is None:
+            for n, entry in enumerate(entries):
+                print("%3d  %s  %s  score=%d after %d turns  %s" % (n, entry['date'], " vs. ".join(entry['players']),
+                                                                  entry['score'], entry['turns'], entry['file']))
+            return
+
+        if catalogGame < 0 or catalogGame >= len(entries):
+            print("Error! There's no game %d in the catalog." % catalogGame)
+            sys.exit(-1)
+
+        loadGame = os.path.join("saved", entries[catalogGame]['file'])
+
     if loadGame is None:
        # If load game wasn't specified in the command line arguments then
        # open a dialog box in the 'saved' folder
        root = tk.Tk()
        root.withdraw()
 
-       loadGame = filedialog.askopenfilename(initialdir="../Submissions_2020")
+       loadGame = filedialog.askopenfilename(initialdir="../Submissions_2020",
+                                             filetypes=[("Saved games", "*.pickle.gz *.replay.gz *.stream"), ("All files", "*")])
 
-    # Load a previously saved game
+    # Load a previously saved game, saved either as frames or as an action log
     SnakeGame.load(loadGame,visResolution=game_settings['visResolution'],
                visSpeed=game_settings['visSpeed'])
 
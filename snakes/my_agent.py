@@ -80,6 +80,34 @@ class Snake:
 
         # return action with max hypothesis value
         return self.actions[indexOfActionTaken]
+
+''' 
+    Batched version of the AgentFunction, called by the arrays and tiles engines once per
+    turn for all the snakes that are still alive - the other engines call AgentFunction
+    for one snake at a time. Calculates the hypothesis values of every snake with a
+    single matrix multiplication and records the actions and percepts in each snake,
+    just like AgentFunction does.
+
+    :param
+        agents - A list of the snakes that need to act this turn.
+        percepts - An array of the stacked percepts of those snakes.
+    :return
+        actions - An array with the action that each snake decides to make this turn.
+'''
+def AgentFunctionBatch(agents, percepts):
+    percepts = np.reshape(percepts, (len(agents), -1))
+    chromosomes = np.array([snake.chromosome for snake in agents])
+
+    # weights multiplied by percepts plus the bias, for every action of every snake
+    hypotheses = np.einsum('nap,np->na', chromosomes[:, :, :-1], percepts) + chromosomes[:, :, -1]
+    actions = np.array(agents[0].actions)[np.argmax(hypotheses, axis=1)]
+
+    for n, snake in enumerate(agents):
+        # record the action and the percepts, as in AgentFunction
+        snake.allActions.append(int(actions[n]))
+        snake.allPercepts += percepts[n].tolist()
+
+    return actions
 ''' 
     Calculates the fitness of each snake in the population argument and returns a list of all fitness values.
         
@@ -24,4 +24,12 @@ class Snake:
         index = np.random.randint(low=0,high=len(self.actions))
         return self.actions[index]
 
+# Optional batched version of AgentFunction - the arrays and tiles engines call it once
+# per turn with the agents of all the live snakes and their stacked percepts, and expect
+# back an array with an action for each of them. The other engines call AgentFunction
+# for one snake at a time, so that each snake sees the moves made before it in the turn
+def AgentFunctionBatch(agents, percepts):
+    actions = np.array(agents[0].actions)
+    index = np.random.randint(low=0,high=len(actions),size=len(agents))
+    return actions[index]
 
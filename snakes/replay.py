@@ -0,0 +1,377 @@
+import numpy as np
+import gzip, pickle
+import zlib, struct
+import os, json
+from datetime import datetime
+
+import snakes
+
+# Action logs of saved games - the settings of the game, the state of its random
+# stream at the start and the action of every snake on every turn. Since the games
+# are deterministic given those, the frames are rebuilt by re-simulating the game
+# with agents that play back the logged actions.
+
+
+# Save the action log of a game played by the engine sgame
+def save_actions(saveFile, sgame, players):
+    game = sgame.game
+
+    data = dict()
+    data['format'] = 'actions'
+    data['players'] = [player.name for player in players]
+    data['settings'] = dict(gridSize=game.gridSize, nTurns=game.nTurns, nFoods=game.nFoods, nAgents=game.nAgents,
+                            engine=game.engineName)
+    data['rnd_state'] = sgame.rnd_state
+    data['turns'] = sgame.turn+1
+    data['actions'] = [np.array([avatar.actions for avatar in player.avatars],dtype='int8') for player in players]
+
+    with gzip.open(saveFile, 'w') as f:
+        pickle.dump(data, f)
+
+
+# Agent that plays back the logged actions of a snake, one per turn
+class ScriptedSnake:
+
+    def __init__(self, actions):
+        self.actions = actions
+        self.turn = 0
+
+    def AgentFunction(self, percepts):
+        action = int(self.actions[self.turn])
+        self.turn += 1
+        return action
+
+
+# Player whose snakes play back the logged actions
+def scripted_player(game, k, name, actions):
+    player = snakes.Player(game, k, None, emptyMode=True)
+    player.name = name
+    player.fieldOfVision = 3
+    player.nFrames = 1
+    player.batch = False
+    player.avatars = [snakes.Avatar(ScriptedSnake(agentActions), player=player) for agentActions in actions]
+    return player
+
+
+# Re-simulate the game of an action log, showing every frame on the visualiser - any
+# object with the show(vis_map, turn, titleStr) method of vis_pygame.visualiser will do
+def replay_actions(data, visualiser, titleStr):
+    return replay_game(data, visualiser, titleStr)[2]
+
+
+# Re-simulate the game of an action log; returns the engine, the players and the score
+def replay_game(data, visualiser, titleStr):
+    game = snakes.SnakeGame(saveFinalGames=False, **data['settings'])
+    game.rnd_fixed_seed.set_state(data['rnd_state'])
+    game.game_messages = ['', '']
+    game.game_saves = list()
+    game.vis = visualiser
+
+    players = [scripted_player(game, k, name, actions) for k, (name, actions) in enumerate(zip(data['players'], data['actions']))]
+
+    sgame = game.engine(game, titleStr, False)
+    return sgame, players, sgame.play(players)
+
+
+# Frames of the game of an action log, as in the vis_map of a game saved as frames
+def replay_frames(data):
+    frames = FrameCollector()
+    replay_actions(data, frames, "")
+    return np.stack(frames.frames, axis=3)
+
+
+# Visualiser that keeps copies of the frames it's shown
+class FrameCollector:
+
+    def __init__(self):
+        self.frames = []
+
+    def show(self, vis_map, turn, titleStr):
+        self.frames.append(vis_map.copy())
+
+
+# Streamed games - the frames are written out during the game, every keyframeInterval
+# frames in full and in between as the cells that changed since the previous frame.
+# The frames from a keyframe up to the next one share a compression stream, flushed
+# after every frame, so that the frames are on disk as soon as they are drawn. The
+# file starts with streamMagic and a header with the players and the grid size, and
+# ends with an index of the offsets of the frames, followed by the offset of the index
+# and streamMagic again, so that any frame can be read from its keyframe and the
+# deltas after it. The index of a file that was cut short is rebuilt by walking the
+# records that made it to disk.
+streamMagic = b'SNKSTRM1'
+keyframeInterval = 32
+
+
+class FrameStreamWriter:
+
+    def __init__(self, saveFile, players, gridSize):
+        self.saveFile = saveFile
+        self.f = open(saveFile, 'wb')
+        self.f.write(streamMagic)
+        self.write_record(zlib.compress(pickle.dumps(dict(players=players, gridSize=gridSize,
+                                                          keyframeInterval=keyframeInterval))))
+
+        self.offsets = []
+        self.previous = None
+
+    # Write a record prefixed with its length
+    def write_record(self, data):
+        self.f.write(struct.pack('<I', len(data)))
+        self.f.write(data)
+
+    def write(self, vis_map):
+        turn = len(self.offsets)
+        self.offsets.append(self.f.tell())
+
+        if turn % keyframeInterval == 0:
+            self.z = zlib.compressobj(9)
+            data = vis_map.tobytes()
+        else:
+            # Changed cells as the gaps between their flat indices, then their values
+            changed = np.flatnonzero(vis_map != self.previous)
+            data = np.diff(changed, prepend=0).astype('<u4').tobytes() + vis_map.ravel()[changed].tobytes()
+
+        self.write_record(self.z.compress(data) + self.z.flush(zlib.Z_SYNC_FLUSH))
+        self.previous = vis_map.copy()
+
+    # Write the index and the end of the file; closing again does nothing
+    def close(self):
+        if self.f.closed:
+            return
+
+        self.index = self.f.tell()
+        self.write_record(zlib.compress(np.array(self.offsets,dtype='<u8').tobytes()))
+        self.f.write(struct.pack('<Q', self.index))
+        self.f.write(streamMagic)
+        self.f.close()
+
+
+class FrameStreamReader:
+
+    def __init__(self, loadFile):
+        self.f = open(loadFile, 'rb')
+        if self.f.read(len(streamMagic)) != streamMagic:
+            raise ValueError("%s is not a streamed game" % loadFile)
+
+        header = pickle.loads(zlib.decompress(self.read_record()))
+        self.players = header['players']
+        self.gridSize = header['gridSize']
+        self.keyframeInterval = header['keyframeInterval']
+
+        start = self.f.tell()
+        self.index = 0
+        self.offsets = self.read_index()
+        if self.offsets is None:
+            self.offsets = self.scan_frames(start)
+
+        # The last frame read, so that frames read in order only cost a delta each
+        self.turn = None
+        self.vis_map = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Offsets of the frames from the index at the end of the file, or None if the file
+    # doesn't end with one
+    def read_index(self):
+        if self.f.seek(0, 2) < 8+len(streamMagic):
+            return None
+
+        self.f.seek(-8-len(streamMagic), 2)
+        index = struct.unpack('<Q', self.f.read(8))[0]
+        if self.f.read(len(streamMagic)) != streamMagic:
+            return None
+
+        self.index = index
+        return np.frombuffer(zlib.decompress(self.read_record(index)), dtype='<u8')
+
+    # Offsets of the frames found by walking the records from the offset of the first
+    # one - a record that was only partly written is left out
+    def scan_frames(self, offset):
+        size = self.f.seek(0, 2)
+
+        offsets = []
+        while offset + 4 <= size:
+            self.f.seek(offset)
+            length = struct.unpack('<I', self.f.read(4))[0]
+            if offset + 4 + length > size:
+                break
+            offsets.append(offset)
+            offset += 4 + length
+
+        return np.array(offsets, dtype='<u8')
+
+    # Read a record at the offset
+    def read_record(self, offset=None):
+        if offset is not None:
+            self.f.seek(int(offset))
+        length = struct.unpack('<I', self.f.read(4))[0]
+        return self.f.read(length)
+
+    # Frame of turn t - the returned array is updated in place by the next read
+    def frame(self, t):
+        keyframe = t - t % self.keyframeInterval
+        if self.turn is None or self.turn > t or self.turn < keyframe:
+            self.z = zlib.decompressobj()
+            data = self.z.decompress(self.read_record(self.offsets[keyframe]))
+            self.vis_map = np.frombuffer(data, dtype='int8').reshape((self.gridSize, self.gridSize, 3)).copy()
+            self.turn = keyframe
+
+        while self.turn < t:
+            self.turn += 1
+            data = self.z.decompress(self.read_record(self.offsets[self.turn]))
+            n = len(data) // 5
+            changed = np.cumsum(np.frombuffer(data[:4*n], dtype='<u4'))
+            self.vis_map.ravel()[changed] = np.frombuffer(data[4*n:], dtype='int8')
+
+        return self.vis_map
+
+    def close(self):
+        self.f.close()
+
+
+# Catalog of the saved games - a line of JSON for each game saved in a folder, added
+# when the game is saved, with the players, the score, the number of turns and a few
+# stats, so that the games can be listed and picked without opening them. For
+# streamed games, offset is where the frame index starts.
+catalogFile = 'catalog.jsonl'
+saveExtensions = ('.pickle.gz', '.replay.gz', '.stream')
+
+
+def catalog_game(saveFile, sgame, players, offset=0):
+    entry = game_entry(saveFile, sgame, players, offset)
+
+    with open(os.path.join(os.path.dirname(saveFile), catalogFile), 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+# Catalog entry of a game played by the engine sgame and saved to saveFile
+def game_entry(saveFile, sgame, players, offset=0):
+    sizes = [[int(np.max(avatar.sizes)) for avatar in player.avatars] for player in players]
+
+    entry = dict()
+    entry['file'] = os.path.basename(saveFile)
+    entry['format'] = sgame.game.saveFormat
+    entry['date'] = datetime.now().isoformat(timespec='seconds')
+    entry['players'] = [player.name for player in players]
+    entry['score'] = sgame.score(players)
+    entry['turns'] = int(sgame.turn+1)
+    entry['gridSize'] = sgame.game.gridSize
+    entry['nAgents'] = sgame.game.nAgents
+    entry['sizes'] = [sum(playerSizes) for playerSizes in sizes]
+    entry['longest'] = [max(playerSizes) for playerSizes in sizes]
+    entry['bytes'] = os.path.getsize(saveFile)
+    entry['offset'] = int(offset)
+    return entry
+
+
+# Rebuild the catalog of a folder from the games saved in it, so that it also lists
+# the games saved before there was a catalog, or whose entries were lost - the entries
+# of the games still there are kept, and the other games are read back from their
+# files; returns the entries, oldest first
+def rebuild_catalog(savePath="saved"):
+    entries = dict((entry['file'], entry) for entry in read_catalog(savePath))
+
+    for saveFile in sorted(os.listdir(savePath)):
+        if saveFile.endswith(saveExtensions) and saveFile not in entries:
+            entries[saveFile] = scan_game(os.path.join(savePath, saveFile))
+
+    entries = sorted(entries.values(), key=lambda entry: entry['date'])
+    with open(os.path.join(savePath, catalogFile), 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+    return entries
+
+
+# Catalog entry of a saved game read back from its file, dated by its name, or by the
+# file if it wasn't named by SnakePlay.save_file. Action logs are re-simulated, which
+# gives the entry the game would have got when it was saved; games saved as frames or
+# streams only keep the frames, where each snake's size is counted in the frame it was
+# hit or the last one, so snakes that died over other snakes come out a little short
+# and the longest snakes aren't known.
+def scan_game(saveFile):
+    if saveFile.endswith('.stream'):
+        reader = FrameStreamReader(saveFile)
+        try:
+            frames = (reader.frame(t) for t in range(len(reader)))
+            entry = frames_entry(saveFile, 'stream', reader.players, frames, offset=reader.index)
+        finally:
+            reader.close()
+
+    else:
+        with gzip.open(saveFile) as f:
+            data = pickle.load(f)
+
+        if isinstance(data, dict):
+            sgame, players, score = replay_game(data, None, None)
+            entry = game_entry(saveFile, sgame, players)
+            entry['format'] = 'actions'
+        else:
+            (player1Name, player2Name, vis_map) = data
+            names = [player1Name] if player2Name is None else [player1Name, player2Name]
+            entry = frames_entry(saveFile, 'frames', names, (vis_map[:,:,:,t] for t in range(vis_map.shape[3])))
+
+    try:
+        date = datetime.strptime(os.path.basename(saveFile)[:20], "%b-%d-%Y-%H-%M-%S")
+    except ValueError:
+        date = datetime.fromtimestamp(os.path.getmtime(saveFile))
+    entry['date'] = date.isoformat(timespec='seconds')
+    return entry
+
+
+# Catalog entry of a game from its frames - the frames of a game saved as frames that
+# ended early are empty after the end
+def frames_entry(saveFile, saveFormat, names, frames, offset=0):
+    sizes = [0]*len(names)
+    turns = 0
+    for t, vis_map in enumerate(frames):
+        if t == 0:
+            gridSize = vis_map.shape[0]
+            nAgents = int(np.sum(vis_map[:,:,0] == 2))
+        if not vis_map.any():
+            break
+
+        turns = t
+        last = vis_map.copy()
+        for k in range(len(names)):
+            sizes[k] += int(np.sum(vis_map[:,:,k] < 0))
+
+    for k in range(len(names)):
+        sizes[k] += int(np.sum(last[:,:,k] > 0))
+
+    entry = dict()
+    entry['file'] = os.path.basename(saveFile)
+    entry['format'] = saveFormat
+    entry['date'] = None
+    entry['players'] = list(names)
+    entry['score'] = sizes[0] if len(sizes) == 1 else sizes[0]-sizes[1]
+    entry['turns'] = turns
+    entry['gridSize'] = int(gridSize)
+    entry['nAgents'] = nAgents
+    entry['sizes'] = sizes
+    entry['longest'] = None
+    entry['bytes'] = os.path.getsize(saveFile)
+    entry['offset'] = int(offset)
+    return entry
+
+
+# Entries of the catalog of a folder whose games are still there, optionally only the
+# games of a given player
+def read_catalog(savePath="saved", player=None):
+    catalog = os.path.join(savePath, catalogFile)
+    if not os.path.isfile(catalog):
+        return []
+
+    entries = []
+    with open(catalog) as f:
+        for line in f:
+            entry = json.loads(line)
+            if not os.path.isfile(os.path.join(savePath, entry['file'])):
+                continue
+            if player is not None and player not in entry['players']:
+                continue
+            entries.append(entry)
+
+    return entries
@@ -30,6 +30,60 @@ game_settings = {
 
    "saveFinalGames": True,
 
+   # Format of the saved games ('frames' - the frames of the whole game, 'actions' -
+   # only the actions of the snakes, re-simulated when the game is loaded, or 'stream' -
+   # keyframes and the changes between frames, written out during the game; the
+   # 'sparse' engine only saves 'actions' or 'stream')
+   "saveFormat": 'frames',
+
+   # Game engine ('default', 'arrays' - keeps the state of all snakes in arrays and
+   # moves them all at once, with every snake perceiving the start of the turn,
+   # 'tiles' - plays like 'arrays' with the grid split into strips handled by processes,
+   # 'sparse' - only stores the occupied cells, for huge and mostly empty grids, or
+   # 'bitboard' - plays like 'default' with the grid packed into bits)
+   "engine": 'default',
+
+   # Run each player's agents in a worker process of their own, exchanging percepts
+   # and actions through shared memory, so that a crash or a hang only loses the game -
+   # the players' agents run at the same time, so it needs the 'arrays' or 'tiles' engine
+   "sandboxAgents": False,
+
+   # Number of strips (and worker processes) for the 'tiles' engine, None for one per core
+   "nTiles": None,
+
+   # Number of games, each with its own random stream, that every training generation
+   # is evaluated on with the chosen engine - the 'arrays' engine plays them in lockstep,
+   # the others one after another - and the snakes' size stats hold the turns of all
+   # the games one after another
+   "trainingGames": 1,
+
+   # Number of worker processes to play the training games of a generation on - with
+   # more than 1, the trainingGames games are played in parallel, with the same results
+   "trainingWorkers": 1,
+
+   # Number of islands, each training its own population in a process of its own -
+   # every migrationInterval generations the nMigrants best agents of each island move
+   # to the next one, and the island with the best final fitness is saved
+   "trainingIslands": 1,
+   "migrationInterval": 10,
+   "nMigrants": 2,
+
+   # Steady-state training - the trainingWorkers processes keep playing games with
+   # candidate populations bred from the current one, whose weakest agents are replaced
+   # as the results come in, and every game counts as a generation
+   "steadyState": False,
+
+   # Headless mode - games are neither shown nor saved (pygame isn't even imported) and
+   # the training progress is written out in batches every progressInterval seconds
+   "headless": False,
+   "progressInterval": 10,
+
+   # Training checkpoints - taken every checkpointInterval generations (0 for none) and
+   # written next to the agent file, and with resumeTraining the training of an agent
+   # picks up from its last checkpoint
+   "checkpointInterval": 0,
+   "resumeTraining": False,
+
    "seed": 0   # seed for game choices, None for random seed
 }
 
@@ -8,20 +8,55 @@ import importlib
 import numpy as np
 import traceback
 import sys
-import gzip, pickle
+import gzip, pickle, copy
+import tempfile, shutil
 from datetime import datetime
 import os
 import signal
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import threading, queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 maxTrainingEpochs = 500
 maxActions = 3
 numPlays = 5
 startingLength = 2
+agentTimeBudget = 60    # seconds of agent time per player per game in tournaments
+migrationTimeout = 600  # seconds an island waits for migrants before it gives up
 
 
 def alarm_handler(signum, frame):
     raise RuntimeError("Time out")
 
+# Seed of the child stream of seed with the given key - the streams form a hierarchy,
+# run -> generation -> game -> player, where each stream only depends on the seed of
+# the run and its key, not on the order the streams are used in
+def child_seed(seed, *key):
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + key)
+
+# State of the global numpy random stream seeded with seed
+def stream_state(seed):
+    return np.random.RandomState(np.random.MT19937(seed)).get_state()
+
+# Merge the copies of agents that played several games back into the agents, game by
+# game - whatever the copies appended to the lists the agents already had is appended
+# to the agents' lists in the order of the games, and the other attributes the
+# copies hold are taken from the first game
+def merge_agents(agents, games):
+    for n, agent in enumerate(agents):
+        copies = [game[n] for game in games]
+        for name, value in vars(copies[0]).items():
+            kept = getattr(agent, name, None)
+            if isinstance(value, list) and isinstance(kept, list):
+                start = len(kept)
+                for agentCopy in copies:
+                    kept.extend(getattr(agentCopy, name)[start:])
+            else:
+                setattr(agent, name, value)
+
 def percepts_global_to_agent_frame_of_reference(percepts,rotation):
 
     if rotation == 90:
@@ -33,52 +68,120 @@ def percepts_global_to_agent_frame_of_reference(percepts,rotation):
 
     return percepts
 
-def actions_agent_to_global_shift(action, rotation):
-
-    # 000
-    # 020
-    # 010   0       a=-1  [0,-1]; a=0 [-1,0]; a=1 [0,1]         0 (-1)  270   0 (1)  90
-
-    # 000
-    # 120
-    # 000   90      a=-1  [-1,0]; a=0 [0,1]; a=1 [1,0]          90 (-1) 0     90 (1) 180
-
-    # 010
-    # 020
-    # 000   180     a=-1  [0,1]; a=0 [1,0]; a=1 [0,-1]          180 (-1)
-
-    # 000
-    # 021
-    # 000   270     a=-1  [1,0]; a=0 [0,-1]; a=1 [-1,0]
-
-    if action == 1:
-        if rotation == 0:
-            return 0,1
-        elif rotation == 90:
-            return 1,0
-        elif rotation == 180:
-            return 0,-1
-        else:
-            return -1,0
-    elif action == -1:
-        if rotation == 0:
-            return 0,-1
-        elif rotation == 90:
-            return -1,0
-        elif rotation == 180:
-            return 0,1
-        else:
-            return 1,0
-    elif action == 0:
-        if rotation == 0:
-            return 1,0
-        elif rotation == 90:
-            return 0,1
-        elif rotation == 180:
-            return -1,0
-        else:
-            return 0,-1
+# 000
+# 020
+# 010   0       a=-1  [0,-1]; a=0 [-1,0]; a=1 [0,1]         0 (-1)  270   0 (1)  90
+
+# 000
+# 120
+# 000   90      a=-1  [-1,0]; a=0 [0,1]; a=1 [1,0]          90 (-1) 0     90 (1) 180
+
+# 010
+# 020
+# 000   180     a=-1  [0,1]; a=0 [1,0]; a=1 [0,-1]          180 (-1)
+
+# 000
+# 021
+# 000   270     a=-1  [1,0]; a=0 [0,-1]; a=1 [-1,0]
+
+# Lookup tables indexed by [rotation//90, action+1] giving the move of the head in
+# the global frame of reference and the rotation after the move
+headMoves = np.array([[[0,-1],[-1,0],[0,1]],
+                      [[-1,0],[0,1],[1,0]],
+                      [[0,1],[1,0],[0,-1]],
+                      [[1,0],[0,-1],[-1,0]]])
+headRotations = (np.arange(4)[:,None]*90 + np.array([-90,0,90])[None,:]) % 360
+
+# Shift applied to the remembered percept frames after a move, indexed the same way
+perceptShifts = np.array([[[0,-1],[1,0],[0,1]],
+                          [[-1,0],[0,1],[1,0]],
+                          [[0,1],[-1,0],[0,-1]],
+                          [[1,0],[0,-1],[-1,0]]])
+
+# Index tables, for each field of vision and rotation//90, that gather a window
+# rotated to the agent's frame of reference, so that np.rot90 is folded into the gather
+perceptRotations = dict()
+for fieldOfVision in [3,5,7,9]:
+    rows, cols = np.indices((fieldOfVision,fieldOfVision))
+    perceptRotations[fieldOfVision] = np.array([[percepts_global_to_agent_frame_of_reference(rows,rotation),
+                                                 percepts_global_to_agent_frame_of_reference(cols,rotation)]
+                                                for rotation in [0,90,180,270]])
+
+def percepts_rotation_indices(fieldOfVision, rotation):
+    return perceptRotations[fieldOfVision][rotation//90]
 
+def actions_agent_to_global_shift(action, rotation):
+    return perceptShifts[rotation//90, action+1]
+
+# Time taken by the agents of a player over a game. Every call to the agents is timed
+# with the performance counter, which doesn't need a system call, and the total is
+# held against the player's budget for the game. The CPU time of the player's turns
+# is taken from the thread clock once per turn. In tournaments the watchdog is armed
+# once per turn, for the time left in the budget, so that it only goes off on an
+# agent that hangs. It only interrupts the agents - when it goes off during the
+# engine's own work, it's armed again at the next call to the agents.
+class AgentTimer:
+
+    def __init__(self, budget, enforce):
+        self.budget = int(budget*1e9)
+        self.enforce = enforce
+        self.reset()
+
+    # Reset the times for a new game
+    def reset(self):
+        self.elapsed = 0
+        self.longest = 0
+        self.calls = 0
+        self.cpu = 0
+        self.calling = False
+        self.expired = False
+
+    # Arm the watchdog for the time left in the budget
+    def arm(self):
+        signal.setitimer(signal.ITIMER_REAL, max(self.budget - self.elapsed, 0)/1e9 + 1)
+
+    # The watchdog going off - an agent that's being called is timed out
+    def alarm(self, signum, frame):
+        if self.calling:
+            raise RuntimeError("Time out")
+        self.expired = True
+
+    # Start of the player's turn - the watchdog goes off on this player's agents
+    def start_turn(self):
+        if self.enforce:
+            signal.signal(signal.SIGALRM, self.alarm)
+            self.expired = False
+            self.arm()
+        self.turn_start = time.thread_time_ns()
+
+    # End of the player's turn
+    def end_turn(self):
+        self.cpu += time.thread_time_ns() - self.turn_start
+        self.calling = False
+        if self.enforce:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    # Start of a call to the agents
+    def start(self):
+        if self.expired:
+            self.expired = False
+            self.arm()
+        self.calling = True
+        self.call_start = time.perf_counter_ns()
+
+    # End of a call to the agents, made for n agents
+    def stop(self, n=1):
+        self.calling = False
+        self.charge(time.perf_counter_ns() - self.call_start, n)
+
+    # Charge the time of a call to the agents, made for n agents
+    def charge(self, elapsed, n=1):
+        self.elapsed += elapsed
+        self.longest = max(self.longest, elapsed)
+        self.calls += n
+
+        if self.enforce and self.elapsed > self.budget:
+            raise RuntimeError("Error! The agents ran over their time budget of %gs for the game" % (self.budget/1e9))
 
 
 # Class avatar is a wrapper for the agent with extra bits required
@@ -94,10 +197,65 @@ class Avatar:
     def reset_for_new_game(self,nTurns):
         self.size = startingLength
         self.sizes = np.zeros((nTurns)).astype('uint32')
+        self.actions = np.zeros((nTurns),dtype='int8')
         self.hit = False
         self.dead = False
-        self.body = []
+        # Body cells from tail to head, each stamped with the value of the clock at which
+        # it expires; the clock counts the moves on which the snake didn't grow
+        self.body = deque()
+        self.clock = 0
+        # Ring buffer of percept frames in the global frame of reference; each frame keeps
+        # the shift accumulated from the moves made since it was seen
         self.percepts = np.zeros((self.player.nFrames,self.player.fieldOfVision,self.player.fieldOfVision)).astype('int')
+        self.percept_shifts = np.zeros((self.player.nFrames,2)).astype('int')
+        self.percept_frame = self.player.nFrames-1
+
+    # Store the newest percept frame over the oldest one
+    def remember_percepts(self,percepts):
+        self.percept_frame = (self.percept_frame+1) % self.player.nFrames
+        self.percepts[self.percept_frame] = percepts
+        self.percept_shifts[self.percept_frame] = 0
+
+    # Percept frames, oldest first, shifted by the moves made since they were seen
+    # and rotated to the agent's frame of reference
+    def recall_percepts(self):
+        nFrames = self.player.nFrames
+        fieldOfVision = self.player.fieldOfVision
+
+        frames = (self.percept_frame + 1 + np.arange(nFrames)) % nFrames
+        rows, cols = percepts_rotation_indices(fieldOfVision,self.rotation)
+        rows = rows[None,:,:] + self.percept_shifts[frames,0,None,None]
+        cols = cols[None,:,:] + self.percept_shifts[frames,1,None,None]
+        inView = (rows >= 0) & (rows < fieldOfVision) & (cols >= 0) & (cols < fieldOfVision)
+
+        percepts = self.percepts[frames[:,None,None],np.clip(rows,0,fieldOfVision-1),np.clip(cols,0,fieldOfVision-1)]
+        percepts[~inView] = 0
+        return percepts
+
+    # Shift the remembered frames by one cell, blanking the row or column of each
+    # frame that falls out of view
+    def shift_percepts(self,y,x):
+        if self.player.nFrames < 2:
+            return
+
+        fieldOfVision = self.player.fieldOfVision
+        self.percept_shifts += [y,x]
+
+        if y != 0:
+            shifts = self.percept_shifts[:,0]
+        else:
+            shifts = self.percept_shifts[:,1]
+
+        if y+x > 0:
+            lost = shifts - 1
+        else:
+            lost = shifts + fieldOfVision
+
+        frames = np.flatnonzero((lost >= 0) & (lost < fieldOfVision))
+        if y != 0:
+            self.percepts[frames,lost[frames],:] = 0
+        else:
+            self.percepts[frames,:,lost[frames]] = 0
 
     def update_size_stats(self,turn):
         if not self.hit:
@@ -106,9 +264,7 @@ class Avatar:
     # Execute AgentFunction that maps percepts to actions
     def action(self, turn, percepts):
 
-        if self.player.game.in_tournament:
-            signal.signal(signal.SIGALRM, alarm_handler)
-            signal.alarm(1)
+        self.player.timer.start()
 
         try:
             action = self.agent.AgentFunction(percepts)
@@ -121,8 +277,7 @@ class Avatar:
                 traceback.print_exc()
                 sys.exit(-1)
 
-        if self.player.game.in_tournament:
-            signal.alarm(0)
+        self.player.timer.stop()
 
         if type(action) != int and type(action) != np.int64 and type(action) != np.int32 and type(action) != np.int8:
             if self.player.game.in_tournament:
@@ -154,6 +309,9 @@ class Player:
         self.fitness = list()
         self.errorMsg = ""
         self.ready = False
+        self.timer = AgentTimer(agentTimeBudget, game.in_tournament)
+        self.sandbox = None
+        self.rnd_state = None
 
         if emptyMode:
             return
@@ -191,7 +349,7 @@ class Player:
             signal.alarm(0)
 
         if self.game.in_tournament:
-            self.name = playerFile.split('.')[1]
+            self.name = playerModule.split('.')[-1]
         else:
             if hasattr(self.exec, 'agentName'):
                 self.name = self.exec.agentName
@@ -230,6 +388,12 @@ class Player:
                 traceback.print_exc()
                 sys.exit(-1)
 
+        # Agents can optionally provide AgentFunctionBatch(agents, percepts), which
+        # maps the stacked percepts of all the live snakes to an array of actions. Only
+        # the arrays and tiles engines call it, as their snakes all perceive the start
+        # of the turn anyway - the other engines call AgentFunction snake by snake
+        self.batch = hasattr(self.exec,'AgentFunctionBatch')
+
         if not hasattr(self.exec,'trainingSchedule'):
             if self.game.in_tournament:
                 signal.alarm(0)
@@ -302,6 +466,7 @@ class Player:
             agentFile = agentFile.replace('.', '/')
 
         self.savedAgent = agentFile + '.tar.gz'
+        self.checkpointFile = agentFile + '.checkpoint.gz'
 
         savedAgent = self.savedAgent
 
@@ -369,6 +534,59 @@ class Player:
             self.avatars.append(avatar)
             self.stats.append(dict())
 
+    # Execute AgentFunctionBatch that maps the percepts of all the given avatars to actions
+    def actions(self, turn, avatars, percepts):
+
+        self.timer.start()
+
+        try:
+            actions = self.exec.AgentFunctionBatch([avatar.agent for avatar in avatars], percepts)
+
+        except Exception as e:
+            if self.game.in_tournament:
+                raise RuntimeError("Error! Failed to execute AgentFunctionBatch - %s" % str(e))
+            else:
+                print("Error! Failed to execute AgentFunctionBatch - %s" % str(e))
+                traceback.print_exc()
+                sys.exit(-1)
+
+        self.timer.stop(len(avatars))
+
+        actions = np.asarray(actions)
+
+        if np.shape(actions) != (len(avatars),) or not np.issubdtype(actions.dtype, np.integer):
+            if self.game.in_tournament:
+                raise RuntimeError("Error! AgentFunctionBatch must return an array of %d integers" % len(avatars))
+            else:
+                print("Error! AgentFunctionBatch must return an array of %d integers" % len(avatars))
+                traceback.print_exc()
+                sys.exit(-1)
+
+        if np.any((actions < -1) | (actions > 1)):
+            if self.game.in_tournament:
+                raise RuntimeError("Error! The returned actions must be integers -1,0, or 1")
+            else:
+                print("Error! The returned actions must be integers -1,0, or 1")
+                traceback.print_exc()
+                sys.exit(-1)
+
+        return actions
+
+    # Start of the player's turn - the agents are timed, and they draw from the player's
+    # own random stream, swapped in for the global numpy stream
+    def start_turn(self):
+        if self.rnd_state is not None:
+            self.outer_rnd_state = np.random.get_state()
+            np.random.set_state(self.rnd_state)
+        self.timer.start_turn()
+
+    # End of the player's turn
+    def end_turn(self):
+        self.timer.end_turn()
+        if self.rnd_state is not None:
+            self.rnd_state = np.random.get_state()
+            np.random.set_state(self.outer_rnd_state)
+
     def avatar_to_agent_stats(self,avatar):
         agent = avatar.agent
         agent.sizes = avatar.sizes
@@ -377,16 +595,28 @@ class Player:
     # Get a new generation of agents
     def new_generation_agents(self,gen):
 
+        new_population, fitness = self.breed_agents()
+        self.record_fitness(fitness)
+
+        # Convert agents to avatars
+        self.agents_to_avatars(new_population)
+
+    # Log the average fitness of a generation
+    def record_fitness(self, fitness):
+        if self.playerFile != 'random_agent.py':
+            self.game.progress("  avg_fitness:  %.2e" % fitness, flush=True)
+        self.fitness.append(fitness)
+
+    # Breed a new population of agents from the current one; returns the new agents and
+    # the fitness newGeneration gives for the current population
+    def breed_agents(self):
+
         # Record game stats in the agent objects
         old_population = list()
         for avatar in self.avatars:
             agent = self.avatar_to_agent_stats(avatar)
             old_population.append(agent)
 
-        if self.playerFile != 'random_agent.py':
-            sys.stdout.write("  avg_fitness: ")
-            sys.stdout.flush()
-
         # Get a new population of agents by calling
         # the provided newGeneration method
         if self.game.in_tournament:
@@ -442,16 +672,18 @@ class Player:
                 traceback.print_exc()
                 sys.exit(-1)
 
-        if self.playerFile != 'random_agent.py':
-            sys.stdout.write(" %.2e" % fitness)
-            sys.stdout.flush()
-        self.fitness.append(fitness)
-
-        # Convert agents to avatars
-        self.agents_to_avatars(new_population)
+        return new_population, fitness
 
     def evaluate_fitness(self):
 
+        fitness = self.rank_avatars()
+        self.game.progress("  avg_fitness: ")
+        self.game.progress(" %.2e\n\n" % np.mean(fitness), flush=True)
+
+    # Evaluate the fitness of the agents with evalFitness and sort the avatars from
+    # the fittest to the weakest
+    def rank_avatars(self):
+
         agents = []
         for avatar in self.avatars:
             agent = self.avatar_to_agent_stats(avatar)
@@ -492,44 +724,277 @@ class Player:
 
         I = np.argsort(fitness)[::-1]
         self.avatars = np.array(self.avatars)[I].tolist()
-        sys.stdout.write("  avg_fitness: ")
-        sys.stdout.write(" %.2e\n\n" % np.mean(fitness))
-        sys.stdout.flush()
+        return np.array(fitness)[I].tolist()
 
 
     def save_trained(self):
 
         savedAgent = self.savedAgent
 
-        sys.stdout.write("Saving last generation agents to %s..."  % self.savedAgent)
-        sys.stdout.flush()
+        self.game.progress("Saving last generation agents to %s..."  % self.savedAgent, flush=True)
         agents = []
         for avatar in self.avatars:
             agents.append(avatar.agent)
 
         with gzip.open(savedAgent,'w') as f:
             pickle.dump(agents, f)
-        sys.stdout.write("done\n")
-        sys.stdout.flush()
+        self.game.progress("done\n", flush=True)
+
+
+# Agents of a player hosted in a worker process of their own, so that an agent that
+# crashes or hangs can't take the game down with it. Every turn the engine leaves the
+# percepts of the player's live snakes in shared memory and sends the worker their
+# number, and the worker leaves the actions in shared memory before it replies. The
+# workers of both players run at the same time, so both players perceive the state at
+# the start of the turn, which is how the 'arrays' and 'tiles' engines play.
+class AgentSandbox:
+
+    def __init__(self, player):
+        self.player = player
+        self.game = player.game
+        self.shape = (len(player.avatars), player.nFrames, player.fieldOfVision)
+
+        nAgents, nFrames, fieldOfVision = self.shape
+        self.shm = shared_memory.SharedMemory(create=True, size=8*nAgents*(nFrames*fieldOfVision**2+2))
+        self.percepts, self.indices, self.actions = sandbox_arrays(self.shm.buf, *self.shape)
+
+        self.conn, conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=sandbox_worker, daemon=True,
+                                               args=(conn, self.shm.name, player.exec.__name__,
+                                                     [avatar.agent for avatar in player.avatars],
+                                                     player.batch, self.shape))
+        self.process.start()
+        conn.close()
+        self.n = 0
+
+    # Give the agents the player's random stream for the game
+    def seed(self, rnd_state):
+        try:
+            self.conn.send(rnd_state)
+        except OSError:
+            raise RuntimeError("Error! The process of the agents died")
+
+    # Send the percepts of the snakes with the given indices to the worker
+    def send(self, indices, percepts):
+        self.n = len(indices)
+        self.indices[:self.n] = indices
+        self.percepts[:self.n] = percepts
+
+        try:
+            self.conn.send(self.n)
+        except OSError:
+            raise RuntimeError("Error! The process of the agents died")
+
+    # Actions of the snakes sent to the worker - in tournaments the worker is given
+    # the time left in the player's budget for the game
+    def receive(self):
+        timer = self.player.timer
+        timeout = None
+        if self.game.in_tournament:
+            timeout = max(timer.budget - timer.elapsed, 0)/1e9 + 1
+
+        if not self.conn.poll(timeout):
+            self.process.kill()
+            raise RuntimeError("Error! Failed to execute AgentFunction - Time out")
+
+        try:
+            reply = self.conn.recv()
+        except EOFError:
+            raise RuntimeError("Error! The process of the agents died")
+
+        if type(reply) == str:
+            raise RuntimeError(reply)
+
+        elapsed, cpu = reply
+        timer.cpu += cpu
+        timer.charge(elapsed, self.n)
+
+        return self.actions[:self.n].copy()
+
+    # Stop the worker and free the shared memory
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+        self.conn.close()
+        del self.percepts, self.indices, self.actions
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Views of the percepts, the indices of the snakes and the actions in the shared
+# memory of a sandbox
+def sandbox_arrays(buf, nAgents, nFrames, fieldOfVision):
+    percepts = np.ndarray((nAgents,nFrames,fieldOfVision,fieldOfVision),dtype='int',buffer=buf)
+    indices = np.ndarray((nAgents),dtype='int',buffer=buf,offset=percepts.nbytes)
+    actions = np.ndarray((nAgents),dtype='int',buffer=buf,offset=percepts.nbytes+indices.nbytes)
+    return percepts, indices, actions
+
+
+# Worker process of a sandbox - plays the agents on the percepts left in the shared
+# memory, replying with the time it took or the error, until it's sent None; it can
+# also be sent the state of the random stream for the agents
+def sandbox_worker(conn, shmName, moduleName, agents, batch, shape):
+    playerModule = importlib.import_module(moduleName)
+    shm = shared_memory.SharedMemory(name=shmName)
+    percepts, indices, actions = sandbox_arrays(shm.buf, *shape)
+
+    while True:
+        n = conn.recv()
+        if n is None:
+            break
+        if type(n) == tuple:
+            np.random.set_state(n)
+            continue
+
+        start, cpu = time.perf_counter_ns(), time.thread_time_ns()
+        try:
+            if batch:
+                try:
+                    result = playerModule.AgentFunctionBatch([agents[i] for i in indices[:n]], percepts[:n].copy())
+                except Exception as e:
+                    raise RuntimeError("Error! Failed to execute AgentFunctionBatch - %s" % str(e))
+
+                result = np.asarray(result)
+                if np.shape(result) != (n,) or not np.issubdtype(result.dtype, np.integer):
+                    raise RuntimeError("Error! AgentFunctionBatch must return an array of %d integers" % n)
+                if np.any((result < -1) | (result > 1)):
+                    raise RuntimeError("Error! The returned actions must be integers -1,0, or 1")
+                actions[:n] = result
+            else:
+                for j in range(n):
+                    try:
+                        action = agents[indices[j]].AgentFunction(percepts[j].copy())
+                    except Exception as e:
+                        raise RuntimeError("Error! Failed to execute AgentFunction - %s" % str(e))
+
+                    if type(action) != int and type(action) != np.int64 and type(action) != np.int32 and type(action) != np.int8:
+                        raise RuntimeError("Error! AgentFunction must return an integer")
+                    if action not in [-1,0,1]:
+                        raise RuntimeError("Error! The returned action must be an integer -1,0, or 1")
+                    actions[j] = action
+        except Exception as e:
+            conn.send(str(e))
+            continue
+
+        conn.send((time.perf_counter_ns() - start, time.thread_time_ns() - cpu))
+
+    del percepts, indices, actions
+    shm.close()
 
 
 class SnakePlay:
 
-    def __init__(self,game,showGame=None,saveGame=False):
+    def __init__(self,game,showGame=None,saveGame=False,seeds=None):
         self.game = game
-        self.map = np.zeros((self.game.gridSize, self.game.gridSize), dtype='int8')
+        self.nFood = 0
+
+        # Given the seed of the game, the game and its players draw from streams of
+        # their own, otherwise the game draws from the random stream of SnakeGame and
+        # the players from the global numpy stream
+        if seeds is None:
+            self.seeds = None
+            self.rnd = self.game.rnd_fixed_seed
+        else:
+            self.seeds = [np.random.SeedSequence(seed) if np.isscalar(seed) else seed for seed in seeds]
+            self.rnd = np.random.RandomState(np.random.MT19937(self.seeds[0]))
+        self.init_grid()
+
         self.showGame = showGame
         self.saveGame = saveGame
 
-        if self.saveGame:
+        # Games saved as action logs are re-simulated when they're loaded, so only the
+        # state of the random stream at the start of the game is kept instead of the
+        # frames; streamed games write each frame out as soon as it's drawn
+        self.saveFrames = saveGame and self.game.saveFormat == 'frames'
+        self.saveStream = saveGame and self.game.saveFormat == 'stream'
+        self.stream = None
+        if self.saveGame and self.game.saveFormat == 'actions':
+            self.rnd_state = self.rnd.get_state()
+
+        if self.saveFrames:
             self.vis_map = np.zeros((self.game.gridSize, self.game.gridSize, 3, self.game.nTurns+1), dtype='int8')
-        elif self.showGame is not None:
+        elif self.showGame is not None or self.saveStream:
             self.vis_map = np.zeros((self.game.gridSize, self.game.gridSize, 3, 1), dtype='int8')
 
 
+    # Reset the players' timers and give them their random streams for the game, the
+    # children of the stream of the game
+    def reset_players(self, players):
+        for k, player in enumerate(players):
+            player.timer.reset()
+
+            if self.seeds is None:
+                player.rnd_state = None
+            else:
+                player.rnd_state = stream_state(child_seed(self.seeds[0], k))
+                if player.sandbox is not None:
+                    player.sandbox.seed(player.rnd_state)
+
+    # Allocate the map, the food layer and the free-cell index
+    def init_grid(self):
+        self.map = np.zeros((self.game.gridSize, self.game.gridSize), dtype='int8')
+        self.food_map = np.zeros((self.game.gridSize, self.game.gridSize), dtype='bool')
+
+        # Index of the cells that are neither occupied nor hold food - the first nFree
+        # entries of free_cells are the free cells, free_index maps a cell to its entry
+        self.free_cells = np.arange(self.game.gridSize**2)
+        self.free_index = np.arange(self.game.gridSize**2)
+        self.nFree = self.game.gridSize**2
+
+    # List of food locations, derived from the food layer for the visualisation
+    @property
+    def food(self):
+        return [(y,x) for y,x in np.argwhere(self.food_map)]
+
+    def add_food(self, y, x):
+        if not self.food_map[y,x]:
+            self.food_map[y,x] = True
+            self.nFood += 1
+            self.update_free(y,x)
+
+    def remove_food(self, y, x):
+        if self.food_map[y,x]:
+            self.food_map[y,x] = False
+            self.nFood -= 1
+            self.update_free(y,x)
+
+    # Set the map value of a cell, keeping the free-cell index up to date
+    def set_cell(self, y, x, value):
+        self.map[y,x] = value
+        self.update_free(y,x)
+
+    # Move cell (y,x) in or out of the free part of the free-cell index
+    def update_free(self, y, x):
+        c = y*self.game.gridSize + x
+        i = self.free_index[c]
+        free = self.map[y,x] == 0 and not self.food_map[y,x]
+
+        if free and i >= self.nFree:
+            j = self.nFree
+            self.nFree += 1
+        elif not free and i < self.nFree:
+            self.nFree -= 1
+            j = self.nFree
+        else:
+            return
+
+        d = self.free_cells[j]
+        self.free_cells[i] = d
+        self.free_cells[j] = c
+        self.free_index[d] = i
+        self.free_index[c] = j
+
     def vis_update(self,i,players,food):
 
-        if not self.saveGame:
+        if not self.saveFrames:
             self.vis_map *= 0
             i = 0
 
@@ -542,7 +1007,7 @@ class SnakePlay:
                 if avatar.hit:
                     j = -1
 
-                for y,x in avatar.body:
+                for y,x,_ in avatar.body:
                     self.vis_map[y,x,k,i] = 1*j
 
                 y,x = avatar.head
@@ -553,6 +1018,90 @@ class SnakePlay:
 
         return self.vis_map[:,:,:,i]
 
+    # Percept layer of the whole grid as seen by player 1 (1 for own bodies, -1 for
+    # the opponent's, 2 for food), padded once so that windows can wrap around
+    def percept_layer(self, pad):
+        layer = np.sign(self.map).astype('int')
+        layer[self.food_map] = 2
+        return np.pad(layer, pad, mode='wrap')
+
+    # Gather the field of vision windows around all the given heads in one go; with
+    # a layer stacked over several games, games gives the game of each head
+    def percept_windows(self, layer, pad, heads, fieldOfVision, games=None):
+        heads = np.reshape(np.array(heads,dtype='int'),(-1,2))
+        offsets = np.arange(fieldOfVision) + pad - fieldOfVision//2
+        rows = heads[:,0,None] + offsets
+        cols = heads[:,1,None] + offsets
+        if games is None:
+            return layer[rows[:,:,None],cols[:,None,:]]
+        else:
+            return layer[games[:,None,None],rows[:,:,None],cols[:,None,:]]
+
+    # Clear a cell vacated by a retracting tail from the percept layer, along with the
+    # copies of it that the padding wrapped around
+    def clear_percept(self, layer, pad, y, x):
+        G = self.game.gridSize
+        copies = np.arange(-(pad//G)-1, pad//G+2)*G + pad
+        rows = (y + copies)[(y + copies >= 0) & (y + copies < G+2*pad)]
+        cols = (x + copies)[(x + copies >= 0) & (x + copies < G+2*pad)]
+        layer[rows[:,None],cols[None,:]] = 0
+
+    # Windows around the given heads as perceived by player k - the opponent's bodies
+    # are seen as 1 and the player's own as -1 by player 2
+    def player_windows(self, layer, pad, heads, player, k):
+        windows = self.percept_windows(layer, pad, heads, player.fieldOfVision)
+        if k!=0:
+            windows = np.where(windows==2, 2, -windows)
+        return windows
+
+    # Percepts of an avatar from its window of the grid, along with the remembered frames
+    def avatar_percepts(self, avatar, window):
+        avatar.remember_percepts(window)
+        return avatar.recall_percepts()
+
+    # Move the head of an avatar according to its action; the tail retracts, unless
+    # the new head lands on food, and the cells it vacates are cleared from the layer
+    def move_avatar(self, avatar, action, food_eaten, layer, pad):
+        y, x = actions_agent_to_global_shift(action,avatar.rotation)
+
+        avatar.shift_percepts(y,x)
+
+        yd, xd = headMoves[avatar.rotation//90, action+1]
+        avatar.rotation = int(headRotations[avatar.rotation//90, action+1])
+
+        y, x = avatar.head
+        y = (y + yd) % self.game.gridSize
+        x = (x + xd) % self.game.gridSize
+
+        avatar.head = (y,x)
+
+        if self.food_map[y,x]:
+            avatar.size += 1
+            food_eaten += [(y,x)]
+        else:
+            avatar.clock += 1
+            while len(avatar.body) > 0 and avatar.body[0][2] <= avatar.clock:
+                y,x,_ = avatar.body.popleft()
+                self.set_cell(y,x,0)
+                self.clear_percept(layer, pad, y, x)
+
+    # Which of the new heads share a cell with another head or landed on a body,
+    # found in a single pass over the head coordinates
+    def collisions(self, heads):
+        heads = np.reshape(np.array(heads,dtype='int'),(-1,2))
+        cells = heads[:,0]*self.game.gridSize + heads[:,1]
+        _, I, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        return (counts[I] > 1) | (self.map[heads[:,0],heads[:,1]] != 0)
+
+    # Mark the avatars whose new heads collided
+    def resolve_collisions(self, avatars):
+        if len(avatars) == 0:
+            return
+
+        hits = self.collisions([avatar.head for avatar in avatars])
+        for i in np.flatnonzero(hits):
+            avatars[i].hit = True
+
     def manhattan_distance(self, x1,y1,x2,y2):
         x = np.min([np.abs(x1-x2),np.abs(x2-x1)])
         y = np.min([np.abs(y1-y2),np.abs(y2-y1)])
@@ -560,58 +1109,26 @@ class SnakePlay:
         return x+y
 
 
-    def place_food(self, heads, food, N=1):
-        candidates = []
-        for y in range(self.game.gridSize):
-            for x in range(self.game.gridSize):
-                if self.map[y,x] == 0 and (y,x) not in food:
-                    candidates += [(y,x)]
-        candidates = np.array(candidates)
-        I = self.game.rnd_fixed_seed.permutation(len(candidates))
-        candidates = candidates[I]
-        #candidates = np.argwhere(self.map==0)
-        #distances = np.zeros((len(candidates)))
+    # Place N pieces of food on cells drawn uniformly from the free-cell index
+    def place_food(self, heads, N=1):
         placements = []
 
-        #for i in range(len(candidates)):
-        #    y2, x2 = candidates[i]
-        #    for y1,x1 in heads:
-        #        distances[i] += self.manhattan_distance(x1,y1,x2,y2)**2
-
-        #    for y1,x1 in food:
-        #        distances[i] += self.manhattan_distance(x1,y1,x2,y2)**2
-
         for n in range(N):
-            #p = distances / np.sum(distances)
-
-            #if len(p) < 1:
-            #    break
-            if len(candidates) < 1:
+            if self.nFree < 1:
                 break
 
-
-            #i = self.game.rnd_fixed_seed.choice(np.arange(len(candidates)), size=1, p=p)[0]
-
-            y,x = candidates[-1]
-            candidates = candidates[:-1]
+            c = self.free_cells[self.rnd.randint(self.nFree)]
+            y,x = divmod(int(c), self.game.gridSize)
+            self.add_food(y,x)
 
             placements += [(y,x)]
 
-            #if i < (len(candidates)-1):
-            #    candidates[i] = candidates[-1]
-            #    distances[i] = distances[-1]
-
-            #candidates = candidates[:-1]
-            #distances = distances[:-1]
-
-            #for i in range(len(candidates)):
-            #    y2, x2 = candidates[i]
-            #    distances[i] += self.manhattan_distance(x, y, x2, y2)**2
-
         return placements
 
 
-    def play(self,players):
+    # Reset the avatars for a new game, placing each snake in its own region of the grid,
+    # and put a piece of food in each region
+    def spawn(self,players):
 
         heads1 = []
         heads2 = []
@@ -629,12 +1146,11 @@ class SnakePlay:
         #        locations[y,x,:]=[y,x]
         #locations = np.reshape(locations,(-1,2))
 
-        #I = self.game.rnd_fixed_seed.permutation(len(locations))
+        #I = self.rnd.permutation(len(locations))
         #locations = locations[I]
-        I = self.game.rnd_fixed_seed.permutation(len(regions))
+        I = self.rnd.permutation(len(regions))
         regions= np.array(regions)[I]
 
-        self.food = []
         # Reset avatars for a new game
         for k,player in enumerate(players):
             #avatar = p.avatars[indices[k]]
@@ -663,34 +1179,7 @@ class SnakePlay:
                     #if ok:
                     #    break
 
-                rotation = self.game.rnd_fixed_seed.choice([0,90,180,270])
-
-                if rotation==0:
-                    jy = 1
-                    jx = 0
-                elif rotation ==90:
-                    jy = 0
-                    jx = -1
-                elif rotation==180:
-                    jy = -1
-                    jx = 0
-                else:
-                    jy = 0
-                    jx = 1
-
-                if k==0:
-                    j = 1
-                else:
-                    j = -1
-
-                for z in range(avatar.size):
-                    y = (yh+jy*z)%self.game.gridSize
-                    x = (xh+jx*z)%self.game.gridSize
-                    self.map[y,x] = (avatar.size-z)*j
-                    avatar.body.append((y, x))
-
-                avatar.head = (yh,xh)
-                avatar.rotation = rotation
+                self.spawn_avatar(avatar,k,yh,xh)
                 if k==0:
                     heads1.append(avatar.head)
                 else:
@@ -704,19 +1193,66 @@ class SnakePlay:
                     for i in range(0,5):
                         if self.map[yr*5+j,xr*5+i] == 0:
                             food_choices.append((yr*5+j, xr*5+i))
-                I = self.game.rnd_fixed_seed.choice(np.arange(len(food_choices)))
-                self.food.append(food_choices[I])
+                I = self.rnd.choice(np.arange(len(food_choices)))
+                self.add_food(*food_choices[I])
 
 
         #heads = heads1 + heads2
         #self.food = self.place_food(heads,food=[],N=self.game.nFoods)
 
+    # Put the head of an avatar of player k at (yh,xh), facing a random direction
+    def spawn_avatar(self,avatar,k,yh,xh):
+        rotation = self.rnd.choice([0,90,180,270])
+
+        # Body trails behind the head, opposite to the straight move
+        jy, jx = -headMoves[rotation//90, 1]
+
+        if k==0:
+            j = 1
+        else:
+            j = -1
+
+        for z in reversed(range(avatar.size)):
+            y = (yh+jy*z)%self.game.gridSize
+            x = (xh+jx*z)%self.game.gridSize
+            self.set_cell(y,x,j)
+            avatar.body.append((y, x, avatar.size-z))
+
+        avatar.head = (yh,xh)
+        avatar.rotation = int(rotation)
+
+    # Update the visualisation and/or the saved game with the state after a turn
+    def vis_frame(self,turn,players):
+        if self.showGame is None and not self.saveFrames and not self.saveStream:
+            return
 
+        vis_map = self.vis_update(turn,players,self.food)
         if self.showGame is not None:
-            vis_map = self.vis_update(0,players,self.food)
-            self.game.vis.show(vis_map, turn=0, titleStr=self.showGame)
-        elif self.saveGame:
-            self.vis_update(0,players,self.food)
+            self.game.vis.show(vis_map, turn=turn, titleStr=self.showGame)
+
+        if self.saveStream:
+            if turn == 0:
+                import replay
+                self.stream = replay.FrameStreamWriter(self.save_file(players, ".stream"),
+                                                       [player.name for player in players], self.game.gridSize)
+            self.stream.write(vis_map)
+
+    # Play the game; returns its score, or None if an agent failed. A streamed game
+    # that doesn't finish still gets the index of the frames it wrote
+    def play(self,players):
+        try:
+            return self.play_game(players)
+        finally:
+            if self.stream is not None:
+                self.stream.close()
+
+    def play_game(self,players):
+
+        self.spawn(players)
+
+        self.reset_players(players)
+
+        self.vis_frame(0,players)
 
         # Play the game over a number of turns
         for turn in range(self.game.nTurns):
@@ -744,68 +1280,28 @@ class SnakePlay:
             # 000   270     a=-1  [1,0]; a=0 [0,-1]; a=1 [-1,0]
 
 
+            # Gather the percepts of the snakes from the state at the start of the turn;
+            # tails retracted by snakes that move earlier in the turn are cleared from
+            # the layer as they retract, so the snakes that move after them see them gone
+            pad = np.max([player.fieldOfVision for player in players]) // 2
+            layer = self.percept_layer(pad)
+
             # Get actions of the agents
             # Reset avatars for a new game
             for k, player in enumerate(players):
 
-                for avatar in player.avatars:
+                avatars = [avatar for avatar in player.avatars if not avatar.dead]
+                if len(avatars) == 0:
+                    continue
 
-                    if avatar.dead:
-                        continue
+                gameDone = False
 
-                    gameDone = False
+                player.start_turn()
+                for avatar in avatars:
 
                     # Percepts
-                    percepts = np.zeros((avatar.player.fieldOfVision,avatar.player.fieldOfVision)).astype('int')
-
-                    pBHalf = avatar.player.fieldOfVision // 2
-
-                    if k==0:
-                        jk=1
-                    else:
-                        jk=-1
-
-                    # Add nearby agents to percepts
-                    for i,io in enumerate(range(-pBHalf,pBHalf+1)):
-                        for j,jo in enumerate(range(-pBHalf,pBHalf+1)):
-                            y = (avatar.head[0] + io)
-                            if y < 0:
-                                y += self.game.gridSize
-                            elif y >= self.game.gridSize:
-                                y -= self.game.gridSize
-
-                            x = (avatar.head[1] + jo)
-                            if x < 0:
-                                x += self.game.gridSize
-                            elif x >= self.game.gridSize:
-                                x -= self.game.gridSize
-
-                            if self.map[y,x] != 0:
-                                percepts[i,j] = jk*np.sign(self.map[y,x])
-
-                            if (y,x) in self.food:
-                                percepts[i,j] = 2
-
-                            #percepts[i,j,1] = self.manhattan_distance(x,y,fx,fy)
-
-                    #percepts[:,:,0] = np.sign(percepts[:,:,0])
-
-                    #y,x = np.unravel_index(percepts[:, :, 1].argmin(), percepts[:, :, 1].shape)
-                    #percepts[:,:,1] *= 0
-                    #percepts[y,x,1] = 1
-
-                    #if k==1:
-                    #    percepts[:,:,0] *= -1
-
-                    #percepts[percepts==0] = 0
-                    #percepts[pBHalf,pBHalf,1] = avatar.rotation // 90
-
-                    avatar.percepts[-1] = percepts
-
-                    percepts = np.zeros((avatar.player.nFrames,avatar.player.fieldOfVision,avatar.player.fieldOfVision)).astype('int')
-
-                    for f in range(avatar.player.nFrames):
-                        percepts[f] = percepts_global_to_agent_frame_of_reference(avatar.percepts[f],avatar.rotation)
+                    window = self.player_windows(layer, pad, [avatar.head], player, k)[0]
+                    percepts = self.avatar_percepts(avatar, window)
 
                     # Get action from agent
                     try:
@@ -822,110 +1318,9 @@ class SnakePlay:
                     if not self.game.game_play:
                         break
 
-                    y, x = actions_agent_to_global_shift(action,avatar.rotation)
-
-                    for f in range(1,avatar.player.nFrames):
-                        memory = avatar.percepts[f]
-                        nY = np.shape(memory)[0]
-                        nX = np.shape(memory)[1]
-                        if y == 1:
-                            for i in range(nY - 1):
-                                memory[i, :] = memory[i + 1, :]
-                            memory[-1, :] = 0
-                        elif y == -1:
-                            for i in range(1, nY):
-                                memory[nY - i, :] = memory[nY - i - 1, :]
-                            memory[0, :] = 0
-                        elif x == 1:
-                            for i in range(nX - 1):
-                                memory[:, i] = memory[:, i + 1]
-                            memory[:, -1] = 0
-                        elif x == -1:
-                            for i in range(1, nX):
-                                memory[:, nX - i] = memory[:, nX - i - 1]
-                            memory[:, 0] = 0
-                        avatar.percepts[f-1] = memory
-
-
-                    #x = avatar.position[0]
-                    #y = avatar.position[1]
-
-                    # 000
-                    # 020
-                    # 010   0       a=-1  [0,-1]; a=0 [-1,0]; a=1 [0,1]         0 (-1)  270   0 (1)  90
-
-                    # 000
-                    # 120
-                    # 000   90      a=-1  [-1,0]; a=0 [0,1]; a=1 [1,0]          90 (-1) 0     90 (1) 180
-
-                    # 010
-                    # 020
-                    # 000   180     a=-1  [0,1]; a=0 [1,0]; a=1 [0,-1]          180 (-1)
-
-                    # 000
-                    # 021
-                    # 000   270     a=-1  [1,0]; a=0 [0,-1]; a=1 [-1,0]
-
-                    # Action 0 is move left
-                    if avatar.rotation == 0 or avatar.rotation==180:
-                        if action == -1:
-                           yd = 0
-                           xd = -1
-                        elif action == 0:
-                           yd = -1
-                           xd = 0
-                        elif action == 1:
-                           yd = 0
-                           xd = 1
-                    else:
-                        if action == -1:
-                           yd = -1
-                           xd = 0
-                        elif action == 0:
-                           yd = 0
-                           xd = 1
-                        elif action == 1:
-                           yd = 1
-                           xd = 0
-
-                    if avatar.rotation >= 180:
-                        xd *= -1
-                        yd *= -1
-
-                    avatar.rotation += action*90
-                    if avatar.rotation < 0:
-                        avatar.rotation += 360
-                    avatar.rotation %= 360
-
-                    y, x = avatar.head
-
-                    y += yd
-                    x += xd
-
-                    if y < 0:
-                        y += self.game.gridSize
-                    if x < 0:
-                        x += self.game.gridSize
-
-                    y %= self.game.gridSize
-                    x %= self.game.gridSize
-
-                    avatar.head = (y,x)
-
-                    if (y,x) in self.food:
-                        avatar.size += 1
-                        food_eaten += [(y,x)]
-                    else:
-                        body = avatar.body
-                        avatar.body = []
-                        for y,x in body:
-                            if self.map[y,x] > 0:
-                                self.map[y,x] -= 1
-                            elif self.map[y,x] < 0:
-                                self.map[y,x] += 1
-
-                            if self.map[y,x] != 0:
-                                avatar.body.append((y,x))
+                    avatar.actions[turn] = action
+                    self.move_avatar(avatar, action, food_eaten, layer, pad)
+                player.end_turn()
 
             if not self.game.game_play:
                 return None
@@ -936,38 +1331,7 @@ class SnakePlay:
                     if not avatar.hit:
                         all_avatars += [avatar]
 
-            heads1 = []
-            heads2 = []
-            for i in range(len(all_avatars)):
-                if all_avatars[i].dead:
-                    continue
-
-                for j in range(i+1,len(all_avatars)):
-
-                    if all_avatars[j].dead:
-                        continue
-
-                    if all_avatars[i].head == all_avatars[j].head:
-                        all_avatars[i].hit = True
-                        all_avatars[j].hit = True
-
-                if all_avatars[i].hit:
-                    continue
-
-                y,x = all_avatars[i].head
-
-                if all_avatars[i].player.player == 0:
-                    j = 1
-                else:
-                    j = -1
-
-                if self.map[y,x] != 0:
-                    all_avatars[i].hit = True
-                else:
-                    if j==1:
-                        heads1.append(all_avatars[i].head)
-                    else:
-                        heads2.append(all_avatars[i].head)
+            self.resolve_collisions(all_avatars)
 
             if gameDone:
                 break
@@ -990,29 +1354,17 @@ class SnakePlay:
                        j=-1
                        heads2.append(avatar.head)
 
-                    self.map[y,x] = avatar.size*j
-                    avatar.body.append((y, x))
+                    self.set_cell(y,x,j)
+                    avatar.body.append((y, x, avatar.clock+avatar.size))
                     avatar.update_size_stats(turn)
 
             for (y,x) in food_eaten:
-                try:
-                    self.food.remove((y,x))
-                except:
-                    pass
-
-            if len(self.food) < self.game.nFoods:
-                self.food += self.place_food(heads1+heads2, self.food, N=self.game.nFoods - len(self.food))
-
-            if self.showGame is not None:
-                i = 0
-
-                if self.saveGame:
-                    i = turn+1
-                vis_map = self.vis_update(i,players,self.food)
-                self.game.vis.show(vis_map, turn=turn+1, titleStr=self.showGame)
-                #self.game.vis.show(self.map, self.food, heads1+colheads1, heads2+colheads2, turn=self.turn+1, titleStr=self.showGame, collisions=collisions)
-            elif self.saveGame:
-                self.vis_update(turn+1,players,self.food)
+                self.remove_food(y,x)
+
+            if self.nFood < self.game.nFoods:
+                self.place_food(heads1+heads2, N=self.game.nFoods - self.nFood)
+
+            self.vis_frame(turn+1,players)
             #needUpdate = False
             for k, player in enumerate(players):
                 for avatar in player.avatars:
@@ -1020,37 +1372,77 @@ class SnakePlay:
                         continue
 
                     if avatar.hit:
-                        for y, x in avatar.body:
-                            self.map[y, x] = 0
-                        avatar.body = []
+                        for y, x, _ in avatar.body:
+                            self.set_cell(y,x,0)
+                        avatar.body.clear()
                         avatar.dead = True
 
             self.turn = turn
 
         if self.saveGame:
-            savePath = "saved"
-            if not os.path.isdir(savePath):
-                os.makedirs(savePath, exist_ok=True)
+            self.save_game(players)
+
+        return self.score(players)
+
+    # Save the visualisation of the game to the saved folder
+    def save_game(self,players):
+        import replay
 
-            now = datetime.now()
-            # Month abbreviation, day and year
-            saveStr = now.strftime("%b-%d-%Y-%H-%M-%S")
+        if self.saveStream:
+            self.stream.close()
+            self.game.game_saves.append(self.stream.saveFile)
+            replay.catalog_game(self.stream.saveFile, self, players, offset=self.stream.index)
+            return
+
+        if self.saveFrames:
+            saveFile = self.save_file(players, ".pickle.gz")
+        else:
+            saveFile = self.save_file(players, ".replay.gz")
+
+        self.game.game_saves.append(saveFile)
+
+        if self.saveFrames:
             if len(players) == 1:
-                saveStr += "-%s" % (players[0].name)
                 name2 = None
             else:
-                saveStr += "-%s-vs-%s" % (players[0].name, players[1].name)
                 name2 = players[1].name
 
-            saveStr += ".pickle.gz"
+            with gzip.open(saveFile, 'w') as f:
+                pickle.dump((players[0].name, name2, self.vis_map), f)
+        else:
+            replay.save_actions(saveFile, self, players)
 
-            saveFile = os.path.join(savePath, saveStr)
+        replay.catalog_game(saveFile, self, players)
 
-            self.game.game_saves.append(saveFile)
+    # Name of a new file in the saved folder for the game
+    def save_file(self,players,extension):
+        savePath = "saved"
+        if not os.path.isdir(savePath):
+            os.makedirs(savePath, exist_ok=True)
 
-            with gzip.open(saveFile, 'w') as f:
-                pickle.dump((players[0].name, name2, self.vis_map), f)
+        now = datetime.now()
+        # Month abbreviation, day and year
+        saveStr = now.strftime("%b-%d-%Y-%H-%M-%S")
+        if len(players) == 1:
+            saveStr += "-%s" % (players[0].name)
+        else:
+            saveStr += "-%s-vs-%s" % (players[0].name, players[1].name)
 
+        # Games saved within the same second are numbered, and the file is created
+        # right away so that the name can't be taken by another game
+        saveFile = os.path.join(savePath, saveStr + extension)
+        n = 1
+        while True:
+            try:
+                open(saveFile, 'x').close()
+                return saveFile
+            except FileExistsError:
+                n += 1
+                saveFile = os.path.join(savePath, "%s-%d%s" % (saveStr, n, extension))
+
+    # Score of the game - the difference of the sums of the biggest sizes reached
+    # by each player's snakes, as Python ints so that the unsigned sizes can't wrap
+    def score(self,players):
         scores = []
         for k, player in enumerate(players):
             scores.append(0)
@@ -1058,7 +1450,7 @@ class SnakePlay:
                 #if avatar.hit:
                 #    continue
 
-                scores[-1] += np.max(avatar.sizes)
+                scores[-1] += int(np.max(avatar.sizes))
 
         if len(scores) == 1:
             return scores[0]
@@ -1066,12 +1458,1003 @@ class SnakePlay:
             return scores[0]-scores[1]
 
 
+# Game engine that keeps the state of all the snakes in contiguous arrays - heads,
+# rotations, sizes, alive flags, player and game ids, with the bodies in a buffer of
+# cells from tail to head - so that each turn is applied with a few array operations.
+# It can advance several independent games in lockstep, each with its own random
+# stream, on maps stacked along the first axis; the same players take part in all
+# of them. Each game is played by copies of the players' agents, called game by game
+# with the players' streams for that game, and what the copies record is merged back
+# into the agents once the games are over, so lockstep games play out exactly like
+# the same games played one after another. All snakes perceive the state from the
+# start of the turn, and the Avatar objects are only used to call the agents and to
+# hold the stats of their snakes.
+class ArraySnakePlay(SnakePlay):
+
+    def __init__(self,game,showGame=None,saveGame=False,nGames=1,seeds=None):
+        self.nGames = nGames
+        SnakePlay.__init__(self,game,showGame,saveGame,seeds)
+
+        # A single game draws from the game's random stream, lockstep games from
+        # streams of their own
+        if nGames == 1:
+            self.rnds = [self.rnd]
+        else:
+            if seeds is None:
+                seeds = self.game.rnd_fixed_seed.randint(2**31,size=nGames)
+            self.rnds = [np.random.RandomState(np.random.MT19937(seed)) for seed in seeds]
+
+    # Allocate the stacked maps and food layers of the games - the map and food layer
+    # of a game are views of them, and food is placed by rejection sampling, so
+    # there's no free-cell index
+    def init_grid(self):
+        self.maps = np.zeros((self.nGames, self.game.gridSize, self.game.gridSize), dtype='int8')
+        self.food_maps = np.zeros((self.nGames, self.game.gridSize, self.game.gridSize), dtype='bool')
+        self.nFoods = np.zeros((self.nGames),dtype='int')
+
+        self.map = self.maps[0]
+        self.food_map = self.food_maps[0]
+
+    # There's no free-cell index to maintain
+    def update_free(self, y, x):
+        pass
+
+    # Players' streams for each of the lockstep games, the children of the streams of
+    # the games
+    def reset_players(self, players):
+        SnakePlay.reset_players(self, players)
+
+        if self.nGames == 1 or self.seeds is None:
+            self.player_states = None
+        else:
+            self.player_states = [[stream_state(child_seed(seed, k)) for k in range(len(players))] for seed in self.seeds]
+
+    # Spawn the snakes of every game and convert them to arrays
+    def spawn_games(self,players):
+        nTurns = self.game.nTurns
+        avatars = [avatar for player in players for avatar in player.avatars]
+        N = len(avatars)
+        self.nAvatars = N
+
+        # Lockstep games are played by copies of the agents, one for each game
+        if self.nGames == 1:
+            self.avatars = avatars
+        else:
+            self.avatars = [Avatar(copy.deepcopy(avatar.agent), player=avatar.player)
+                            for g in range(self.nGames) for avatar in avatars]
+        self.game_id = np.repeat(np.arange(self.nGames), N)
+        self.player_id = np.tile([k for k,player in enumerate(players) for avatar in player.avatars], self.nGames)
+        self.signs = np.where(self.player_id == 0, 1, -1)
+
+        # Index of each snake among the snakes of its player, across the games
+        first = np.searchsorted(self.player_id[:N], np.arange(len(players)))
+        counts = np.array([len(player.avatars) for player in players])
+        self.local = self.game_id*counts[self.player_id] + np.arange(N*self.nGames) % N - first[self.player_id]
+
+        self.heads = np.zeros((N*self.nGames,2),dtype='int')
+        self.rotations = np.zeros((N*self.nGames),dtype='int')
+        self.sizes = np.zeros((N*self.nGames),dtype='int')
+        self.alive = np.ones((N*self.nGames),dtype='bool')
+        self.hit = np.zeros((N*self.nGames),dtype='bool')
+
+        self.bodies = np.zeros((N*self.nGames,startingLength+nTurns,2),dtype='int')
+        self.tails = np.zeros((N*self.nGames),dtype='int')
+
+        for g in range(self.nGames):
+            self.map = self.maps[g]
+            self.food_map = self.food_maps[g]
+            self.nFood = 0
+            self.rnd = self.rnds[g]
+            self.spawn(players)
+            self.nFoods[g] = self.nFood
+
+            for n, avatar in enumerate(avatars):
+                self.heads[g*N+n] = avatar.head
+                self.rotations[g*N+n] = avatar.rotation
+                self.sizes[g*N+n] = avatar.size
+                self.bodies[g*N+n,:avatar.size] = [(y,x) for y,x,_ in avatar.body]
+
+        self.ends = self.sizes.copy()
+
+        # The visualisation shows the first game
+        self.map = self.maps[0]
+        self.food_map = self.food_maps[0]
+        self.nFood = self.nFoods[0]
+
+        # The avatars' size stats and actions are views of the rows of the size and
+        # action histories, with the turns of all the games one after another
+        self.size_history = np.zeros((N,self.nGames,nTurns),dtype='uint32')
+        self.action_history = np.zeros((N,self.nGames,nTurns),dtype='int8')
+        for n, avatar in enumerate(avatars):
+            avatar.sizes = np.reshape(self.size_history[n],(-1))
+            avatar.actions = np.reshape(self.action_history[n],(-1))
+
+        # Percept memory of each player - a ring buffer of frames for each snake, with
+        # the shifts accumulated since the frames were seen and the newest frame's slot
+        self.percept_frames = []
+        self.percept_shifts = []
+        self.percept_slots = []
+        for k, player in enumerate(players):
+            nFrames, fieldOfVision = player.nFrames, player.fieldOfVision
+            self.percept_frames.append(np.zeros((counts[k]*self.nGames,nFrames,fieldOfVision,fieldOfVision),dtype='int'))
+            self.percept_shifts.append(np.zeros((counts[k]*self.nGames,nFrames,2),dtype='int'))
+            self.percept_slots.append(nFrames-1)
+
+    # Cells of the bodies of the given snakes
+    def body_cells(self, snakes):
+        positions = np.arange(np.shape(self.bodies)[1])
+        inBody = (positions[None,:] >= self.tails[snakes,None]) & (positions[None,:] < self.ends[snakes,None])
+        return self.bodies[snakes][inBody]
+
+    # Percept layers of all the games, padded for the wraparound
+    def percept_layer(self, pad):
+        layer = np.sign(self.maps).astype('int')
+        layer[self.food_maps] = 2
+        return np.pad(layer, ((0,0),(pad,pad),(pad,pad)), mode='wrap')
+
+    # Percepts of the given snakes of player k, from their windows of the percept layer
+    # and the frames they remember
+    def player_percepts(self, layer, pad, k, snakes, player):
+        windows = self.percept_windows(layer, pad, self.heads[snakes], player.fieldOfVision, self.game_id[snakes])
+        if k!=0:
+            windows = np.where(windows==2, 2, -windows)
+        return self.recall_percepts(k, snakes, windows)
+
+    # Store the newest windows of the given snakes of player k and recall all their
+    # frames, shifted by the moves made since they were seen and rotated to the
+    # agents' frame of reference
+    def recall_percepts(self, k, snakes, windows):
+        nFrames = np.shape(self.percept_frames[k])[1]
+        self.percept_slots[k] = (self.percept_slots[k] + 1) % nFrames
+        return self.frame_percepts(k, snakes, windows)
+
+    # Store the windows in the newest frame slot and gather the percepts of the
+    # given snakes of player k
+    def frame_percepts(self, k, snakes, windows):
+        frames = self.percept_frames[k]
+        shifts = self.percept_shifts[k]
+        nFrames, fieldOfVision = np.shape(frames)[1], np.shape(frames)[2]
+        local = self.local[snakes]
+
+        frames[local,self.percept_slots[k]] = windows
+        shifts[local,self.percept_slots[k]] = 0
+
+        slots = (self.percept_slots[k] + 1 + np.arange(nFrames)) % nFrames
+        indices = perceptRotations[fieldOfVision][self.rotations[snakes]//90]
+        rows = indices[:,None,0] + shifts[local[:,None],slots[None,:],0][:,:,None,None]
+        cols = indices[:,None,1] + shifts[local[:,None],slots[None,:],1][:,:,None,None]
+        inView = (rows >= 0) & (rows < fieldOfVision) & (cols >= 0) & (cols < fieldOfVision)
+
+        percepts = frames[local[:,None,None,None],slots[None,:,None,None],
+                          np.clip(rows,0,fieldOfVision-1),np.clip(cols,0,fieldOfVision-1)]
+        percepts[~inView] = 0
+        return percepts
+
+    # Shift the remembered frames of the given snakes of player k by their moves,
+    # blanking the row or column of each frame that falls out of view
+    def shift_percepts(self, k, snakes, moves):
+        frames = self.percept_frames[k]
+        shifts = self.percept_shifts[k]
+        nFrames, fieldOfVision = np.shape(frames)[1], np.shape(frames)[2]
+        if nFrames < 2:
+            return
+
+        local = self.local[snakes]
+        shifts[local] += moves[:,None,:]
+
+        vertical = moves[:,0] != 0
+        moved = np.where(vertical[:,None], shifts[local,:,0], shifts[local,:,1])
+        lost = np.where((np.sum(moves,axis=1) > 0)[:,None], moved - 1, moved + fieldOfVision)
+
+        n, f = np.nonzero((lost >= 0) & (lost < fieldOfVision))
+        rows = vertical[n]
+        frames[local[n[rows]],f[rows],lost[n[rows],f[rows]],:] = 0
+        frames[local[n[~rows]],f[~rows],:,lost[n[~rows],f[~rows]]] = 0
+
+    # Move the given snakes, whose heads have moved already - the tails of the snakes
+    # that didn't eat retract, and the heads of the snakes that didn't collide become
+    # part of their bodies; returns which of the snakes collided
+    def move_snakes(self, snakes, ate):
+        self.retract_tails(snakes[~ate])
+        hit = self.snake_collisions(snakes)
+        self.grow_heads(snakes[~hit])
+        return hit
+
+    # Which of the given snakes' new heads share a cell with another head of the
+    # same game or landed on a body
+    def snake_collisions(self, snakes):
+        games = self.game_id[snakes]
+        heads = self.heads[snakes]
+        cells = (games*self.game.gridSize + heads[:,0])*self.game.gridSize + heads[:,1]
+        _, I, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        return (counts[I] > 1) | (self.maps[games,heads[:,0],heads[:,1]] != 0)
+
+    # Retract the tails of the given snakes, clearing the cells they leave
+    def retract_tails(self, snakes):
+        tails = self.bodies[snakes,self.tails[snakes]]
+        self.maps[self.game_id[snakes],tails[:,0],tails[:,1]] = 0
+        self.tails[snakes] += 1
+
+    # Make the new heads of the given snakes part of their bodies
+    def grow_heads(self, snakes):
+        self.maps[self.game_id[snakes],self.heads[snakes,0],self.heads[snakes,1]] = self.signs[snakes]
+        self.bodies[snakes,self.ends[snakes]] = self.heads[snakes]
+        self.ends[snakes] += 1
+
+    # Clear the bodies of the given snakes from the maps
+    def clear_bodies(self, snakes):
+        cells = self.body_cells(snakes)
+        self.maps[np.repeat(self.game_id[snakes],self.ends[snakes]-self.tails[snakes]),cells[:,0],cells[:,1]] = 0
+
+    # Place N pieces of food in game g on cells drawn uniformly from the free ones by
+    # rejection sampling, which only needs a few draws as long as the grid is not
+    # nearly full
+    def place_game_food(self, g, N):
+        gridCells = self.game.gridSize**2
+        inGame = self.alive & (self.game_id == g)
+        nFree = gridCells - self.nFoods[g] - np.sum(self.ends[inGame] - self.tails[inGame])
+        map = self.maps[g]
+        food_map = self.food_maps[g]
+        rnd = self.rnds[g]
+        placed = 0
+
+        while placed < N and nFree > 0:
+            if nFree < gridCells // 4:
+                free = np.flatnonzero((map == 0) & ~food_map)
+                cells = free[rnd.permutation(len(free))]
+            else:
+                cells = rnd.randint(gridCells,size=N-placed)
+
+            for c in cells:
+                y,x = divmod(int(c), self.game.gridSize)
+                if map[y,x] == 0 and not food_map[y,x]:
+                    food_map[y,x] = True
+                    self.nFoods[g] += 1
+                    placed += 1
+                    nFree -= 1
+                    if placed == N:
+                        break
+
+    def vis_update(self,i,players,food):
+
+        if not self.saveFrames:
+            self.vis_map *= 0
+            i = 0
+
+        vis_map = self.vis_map[:,:,:,i]
+        for k in range(len(players)):
+            vis_map[:,:,k] = self.maps[0] == (1 if k==0 else -1)
+
+        hit = np.flatnonzero(self.alive & self.hit & (self.game_id == 0))
+        cells = self.body_cells(hit)
+        vis_map[cells[:,0],cells[:,1],self.player_id[np.repeat(hit,self.ends[hit]-self.tails[hit])]] = -1
+
+        alive = np.flatnonzero(self.alive & (self.game_id == 0))
+        vis_map[self.heads[alive,0],self.heads[alive,1],self.player_id[alive]] = np.where(self.hit[alive],-2,2)
+
+        vis_map[self.food_maps[0],2] = 1
+
+        return vis_map
+
+    def play_game(self,players):
+
+        self.spawn_games(players)
+
+        self.reset_players(players)
+
+        self.vis_frame(0,players)
+
+        pad = np.max([player.fieldOfVision for player in players]) // 2
+        actions = np.zeros(len(self.avatars),dtype='int')
+
+        # Play the games over a number of turns
+        for turn in range(self.game.nTurns):
+
+            live = np.flatnonzero(self.alive)
+            if len(live) == 0:
+                break
+
+            # Get actions of the agents, from the state at the start of the turn
+            layer = self.percept_layer(pad)
+            for k, player in enumerate(players):
+                snakes = live[self.player_id[live] == k]
+                if len(snakes) == 0:
+                    continue
+
+                percepts = self.player_percepts(layer, pad, k, snakes, player)
+
+                # Sandboxed agents are sent their percepts now, and their actions are
+                # collected once every player has had its turn
+                if player.sandbox is not None:
+                    try:
+                        player.sandbox.send(self.local[snakes], percepts)
+                    except Exception as e:
+                        if self.game.in_tournament:
+                            self.game.game_messages[k] = str(e)
+                            self.game.game_play = False
+                            return None
+                        else:
+                            traceback.print_exc()
+                            sys.exit(-1)
+                    continue
+
+                # The agents are called game by game, each game with the player's
+                # stream for it
+                for g in np.unique(self.game_id[snakes]):
+                    I = np.flatnonzero(self.game_id[snakes] == g)
+                    if self.player_states is not None:
+                        player.rnd_state = self.player_states[g][k]
+
+                    player.start_turn()
+                    try:
+                        if player.batch:
+                            actions[snakes[I]] = player.actions(turn+1, [self.avatars[i] for i in snakes[I]], percepts[I])
+                        else:
+                            for n in I:
+                                actions[snakes[n]] = self.avatars[snakes[n]].action(turn+1, percepts[n])
+                    except Exception as e:
+                        if self.game.in_tournament:
+                            self.game.game_messages[k] = str(e)
+                            self.game.game_play = False
+                        else:
+                            traceback.print_exc()
+                            sys.exit(-1)
+                    player.end_turn()
+
+                    if self.player_states is not None:
+                        self.player_states[g][k] = player.rnd_state
+
+                    if not self.game.game_play:
+                        return None
+
+                self.shift_percepts(k, snakes, perceptShifts[self.rotations[snakes]//90, actions[snakes]+1])
+
+            # Actions of the sandboxed agents
+            for k, player in enumerate(players):
+                snakes = live[self.player_id[live] == k]
+                if player.sandbox is None or len(snakes) == 0:
+                    continue
+
+                try:
+                    actions[snakes] = player.sandbox.receive()
+                except Exception as e:
+                    if self.game.in_tournament:
+                        self.game.game_messages[k] = str(e)
+                        self.game.game_play = False
+                    else:
+                        traceback.print_exc()
+                        sys.exit(-1)
+
+                if not self.game.game_play:
+                    return None
+
+                self.shift_percepts(k, snakes, perceptShifts[self.rotations[snakes]//90, actions[snakes]+1])
+
+            self.action_history[live % self.nAvatars,self.game_id[live],turn] = actions[live]
+
+            # Move the heads
+            index = (self.rotations[live]//90, actions[live]+1)
+            self.heads[live] = (self.heads[live] + headMoves[index]) % self.game.gridSize
+            self.rotations[live] = headRotations[index]
+            games = self.game_id[live]
+
+            # Snakes that landed on food grow, the tails of the others retract
+            ate = self.food_maps[games,self.heads[live,0],self.heads[live,1]]
+            self.sizes[live[ate]] += 1
+            eaten = np.unique(np.column_stack((games[ate],self.heads[live[ate]])),axis=0)
+
+            hit = self.move_snakes(live, ate)
+            self.hit[live[hit]] = True
+
+            moved = live[~hit]
+            self.size_history[moved % self.nAvatars,self.game_id[moved],turn] = self.sizes[moved]
+
+            self.food_maps[eaten[:,0],eaten[:,1],eaten[:,2]] = False
+            self.nFoods -= np.bincount(eaten[:,0],minlength=self.nGames)
+
+            for g in range(self.nGames):
+                if self.nFoods[g] < self.game.nFoods:
+                    self.place_game_food(g, self.game.nFoods - self.nFoods[g])
+            self.nFood = self.nFoods[0]
+
+            self.vis_frame(turn+1,players)
+
+            # Clear the bodies of the snakes that collided
+            dead = live[hit]
+            self.clear_bodies(dead)
+            self.alive[dead] = False
+
+            self.turn = turn
+
+        if self.saveGame:
+            self.save_game(players)
+
+        # What the copies of the agents recorded goes back into the players' agents
+        if self.nGames > 1:
+            N = self.nAvatars
+            merge_agents([avatar.agent for player in players for avatar in player.avatars],
+                         [[avatar.agent for avatar in self.avatars[g*N:(g+1)*N]] for g in range(self.nGames)])
+
+        if self.nGames == 1:
+            return self.score(players)
+
+        # Scores of all the games
+        best = np.max(self.size_history,axis=2).astype('int')
+        player_id = self.player_id[:len(best)]
+        scores = np.sum(best[player_id==0],axis=0)
+        if len(players) > 1:
+            scores -= np.sum(best[player_id==1],axis=0)
+        return scores.tolist()
+
+# Game engine that splits the grid into strips of rows, one per worker process, for
+# very large games. The state of the game that the strips work on - the maps, the
+# bodies of the snakes and their percept memories - is kept in shared memory. Each
+# turn every worker builds the percept layer of its strip, with halo rows read from
+# the strips next to it so that the windows of the heads near its edges are whole,
+# and gathers the percepts of the snakes whose heads are in its strip. The moves are
+# resolved in the strips too - each strip clears the tails and bodies that lie in it,
+# and checks and places the new heads that land in it, so heads that share a cell are
+# always found by the same strip. The workers are only sent the indices of their
+# snakes, their results are put back in snake order, and the game plays out exactly
+# as with the arrays engine. The agents are still called from the main process, in
+# the same order.
+class TiledSnakePlay(ArraySnakePlay):
+
+    def __init__(self,game,showGame=None,saveGame=False,seeds=None):
+        ArraySnakePlay.__init__(self,game,showGame,saveGame,seeds=seeds)
+
+        nTiles = self.game.nTiles
+        if nTiles is None:
+            nTiles = os.cpu_count()
+        nTiles = max(1,min(nTiles,self.game.gridSize))
+        self.tile_edges = np.linspace(0,self.game.gridSize,nTiles+1).astype('int')
+        self.strips = []
+
+    # Arrays of the game that the strips work on, and the buffers they leave their
+    # percepts and collisions in
+    def strip_arrays(self):
+        arrays = dict(maps=self.maps, food_maps=self.food_maps, heads=self.heads, rotations=self.rotations,
+                      bodies=self.bodies, tails=self.tails, ends=self.ends, game_id=self.game_id,
+                      signs=self.signs, local=self.local, collided=np.zeros(len(self.heads),dtype='bool'))
+        for k in range(len(self.percept_frames)):
+            arrays['percept_frames%d' % k] = self.percept_frames[k]
+            arrays['percept_shifts%d' % k] = self.percept_shifts[k]
+            arrays['percept_buffer%d' % k] = np.zeros_like(self.percept_frames[k])
+        return arrays
+
+    # Play with the given arrays of the game
+    def bind_arrays(self, arrays):
+        for name in ['maps', 'food_maps', 'heads', 'rotations', 'bodies', 'tails', 'ends', 'game_id', 'signs',
+                     'local', 'collided']:
+            setattr(self, name, arrays[name])
+
+        nPlayers = len([name for name in arrays if name.startswith('percept_frames')])
+        self.percept_frames = [arrays['percept_frames%d' % k] for k in range(nPlayers)]
+        self.percept_shifts = [arrays['percept_shifts%d' % k] for k in range(nPlayers)]
+        self.percept_buffers = [arrays['percept_buffer%d' % k] for k in range(nPlayers)]
+
+        self.map = self.maps[0]
+        self.food_map = self.food_maps[0]
+
+    # Spawn the snakes, move the arrays of the game to shared memory and start a worker
+    # for each strip
+    def spawn_games(self, players):
+        ArraySnakePlay.spawn_games(self, players)
+
+        arrays = self.strip_arrays()
+        layout, size = shared_layout(arrays)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.shared = shared_arrays(self.shm.buf, layout)
+        for name, array in arrays.items():
+            self.shared[name][...] = array
+        self.bind_arrays(self.shared)
+
+        settings = self.game.worker_settings()
+        for t in range(len(self.tile_edges)-1):
+            conn, workerConn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=strip_worker, daemon=True,
+                                              args=(workerConn, self.shm.name, layout, settings, self.tile_edges))
+            process.start()
+            workerConn.close()
+            self.strips.append((conn, process))
+
+    # Stop the workers and move the arrays of the game out of the shared memory
+    def close_strips(self):
+        for conn, process in self.strips:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+
+        for conn, process in self.strips:
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            conn.close()
+        self.strips = []
+
+        if hasattr(self, 'shm'):
+            self.bind_arrays({name: array.copy() for name, array in self.shared.items()})
+            del self.shared
+            try:
+                self.shm.close()
+            except BufferError:
+                pass
+            self.shm.unlink()
+            del self.shm
+
+    # Run a job on every strip, with the arguments of each strip, and wait for all of
+    # them
+    def run_tiles(self, job, args):
+        for (conn, process), tileArgs in zip(self.strips, args):
+            conn.send((job,) + tileArgs)
+
+        errors = []
+        for conn, process in self.strips:
+            try:
+                reply = conn.recv()
+            except EOFError:
+                reply = "Error! The process of a strip died"
+            if reply is not None:
+                errors.append(reply)
+
+        if len(errors) > 0:
+            raise RuntimeError(errors[0])
+
+    # Strip of each of the given rows
+    def row_tiles(self, rows):
+        return np.searchsorted(self.tile_edges, rows, side='right') - 1
+
+    # Indices of the items in each strip, given the strip of each item
+    def tile_items(self, tile):
+        return [np.flatnonzero(tile == t) for t in range(len(self.tile_edges)-1)]
+
+    # The workers build the percept layers of their strips
+    def percept_layer(self, pad):
+        self.run_tiles('strip_layer', [(t, pad) for t in range(len(self.tile_edges)-1)])
+        return None
+
+    # Percept layer of the strip of all the games, with pad halo rows above and below
+    # it and padded for the wraparound
+    def strip_layer(self, t, pad):
+        rows = np.arange(self.tile_edges[t]-pad, self.tile_edges[t+1]+pad) % self.game.gridSize
+        layer = np.sign(self.maps[:,rows]).astype('int')
+        layer[self.food_maps[:,rows]] = 2
+        self.layer = np.pad(layer, ((0,0),(0,0),(pad,pad)), mode='wrap')
+
+    # Gather the percepts of the strips in parallel - each snake's memory belongs to
+    # the strip its head is in
+    def player_percepts(self, layer, pad, k, snakes, player):
+        nFrames = np.shape(self.percept_frames[k])[1]
+        self.percept_slots[k] = (self.percept_slots[k] + 1) % nFrames
+
+        items = self.tile_items(self.row_tiles(self.heads[snakes,0]))
+        self.run_tiles('strip_percepts', [(t, pad, k, self.percept_slots[k], snakes[I], I) for t, I in enumerate(items)])
+        return self.percept_buffers[k][:len(snakes)].copy()
+
+    # Percepts of the given snakes of player k, whose heads are in the strip, left in
+    # the player's buffer at I
+    def strip_percepts(self, t, pad, k, slot, snakes, I):
+        if len(snakes) == 0:
+            return
+
+        fieldOfVision = np.shape(self.percept_frames[k])[2]
+        heads = self.heads[snakes] - [self.tile_edges[t], 0]
+        windows = ArraySnakePlay.percept_windows(self, self.layer, pad, heads, fieldOfVision, self.game_id[snakes])
+        if k!=0:
+            windows = np.where(windows==2, 2, -windows)
+
+        self.percept_slots[k] = slot
+        self.percept_buffers[k][I] = self.frame_percepts(k, snakes, windows)
+
+    # Shift the percept memories of the strips in parallel
+    def shift_percepts(self, k, snakes, moves):
+        if np.shape(self.percept_frames[k])[1] < 2:
+            return
+
+        items = self.tile_items(self.row_tiles(self.heads[snakes,0]))
+        self.run_tiles('strip_shift', [(k, snakes[I], moves[I]) for I in items])
+
+    def strip_shift(self, k, snakes, moves):
+        if len(snakes) > 0:
+            ArraySnakePlay.shift_percepts(self, k, snakes, moves)
+
+    # Move the snakes of the strips in parallel, in one go - a strip only reads and
+    # writes the cells in it, the ones its tails leave and its heads land on, and heads
+    # in the same cell are in the same strip
+    def move_snakes(self, snakes, ate):
+        retracting = snakes[~ate]
+        tails = self.bodies[retracting,self.tails[retracting]]
+        tailItems = self.tile_items(self.row_tiles(tails[:,0]))
+        headItems = self.tile_items(self.row_tiles(self.heads[snakes,0]))
+
+        self.run_tiles('strip_move', [(retracting[J], snakes[I], I) for J, I in zip(tailItems, headItems)])
+        return self.collided[:len(snakes)].copy()
+
+    # Retract the given tails of the strip, then find which of its heads collided and
+    # place the others, leaving the collisions in the buffer at I
+    def strip_move(self, retracting, snakes, I):
+        ArraySnakePlay.retract_tails(self, retracting)
+        if len(snakes) > 0:
+            hit = ArraySnakePlay.snake_collisions(self, snakes)
+            ArraySnakePlay.grow_heads(self, snakes[~hit])
+            self.collided[I] = hit
+
+    # Clear the body cells of the strips in parallel - every strip is sent all the
+    # snakes, and clears the cells of their bodies that lie in it
+    def clear_bodies(self, snakes):
+        if len(snakes) > 0:
+            self.run_tiles('strip_clear', [(t, snakes) for t in range(len(self.tile_edges)-1)])
+
+    def strip_clear(self, t, snakes):
+        cells = self.body_cells(snakes)
+        games = np.repeat(self.game_id[snakes],self.ends[snakes]-self.tails[snakes])
+        I = np.flatnonzero(self.row_tiles(cells[:,0]) == t)
+        self.maps[games[I],cells[I,0],cells[I,1]] = 0
+
+    def play_game(self,players):
+        try:
+            return ArraySnakePlay.play_game(self,players)
+        finally:
+            self.close_strips()
+
+
+# Layout of the arrays in a block of shared memory - the name, shape, type and offset
+# of each, and the size of the block
+def shared_layout(arrays):
+    layout = []
+    offset = 0
+    for name, array in arrays.items():
+        layout.append((name, array.shape, array.dtype.str, offset))
+        offset += (array.nbytes + 7) // 8 * 8
+    return layout, max(offset, 1)
+
+
+# Views of the arrays of a layout in a buffer of shared memory
+def shared_arrays(buf, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset) for name, shape, dtype, offset in layout}
+
+
+# Worker process of a strip of the tiles engine - runs the strip jobs it's sent on the
+# arrays of the game in the shared memory, replying with None or the error, until it's
+# sent None
+def strip_worker(conn, shmName, layout, settings, tileEdges):
+    shm = shared_memory.SharedMemory(name=shmName)
+    play = TiledSnakePlay(SnakeGame(saveFinalGames=False, **settings))
+    play.tile_edges = tileEdges
+    play.bind_arrays(shared_arrays(shm.buf, layout))
+    play.percept_slots = [0]*len(play.percept_frames)
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        try:
+            getattr(play, job[0])(*job[1:])
+        except Exception as e:
+            conn.send("Error! Strip %s failed - %s" % (job[0], repr(e)))
+            continue
+
+        conn.send(None)
+
+    del play
+    shm.close()
+
+
+# Layer of a sparse grid - a dictionary of the cells (y,x) that are set, which reads
+# as the default value everywhere else
+class SparseGrid(dict):
+
+    def __init__(self, default):
+        dict.__init__(self)
+        self.default = default
+
+    def __missing__(self, key):
+        return self.default
+
+
+# Game engine for huge, mostly empty grids. It plays like the default engine, but
+# the map and the food layer only hold the cells that are occupied, so memory and the
+# cost of a turn grow with the number of snake cells and food rather than with the
+# area of the grid. The snakes are spawned in randomly drawn regions and the food is
+# placed by rejection sampling, without going over the whole grid; the game starts
+# with nFoods pieces of food instead of one in every region.
+class SparseSnakePlay(SnakePlay):
+
+    # The frames of a whole game would take a dense copy of the grid for every turn,
+    # so the games of this engine are only saved as action logs or streams
+    def __init__(self,game,showGame=None,saveGame=False,seeds=None):
+        if saveGame and game.saveFormat == 'frames':
+            if game.in_tournament:
+                raise RuntimeError("Error! Games of the 'sparse' engine can't be saved as frames, which take the whole grid for every turn.  Save them as 'actions' or 'stream'")
+            else:
+                print("Error! Games of the 'sparse' engine can't be saved as frames, which take the whole grid for every turn.  Save them as 'actions' or 'stream'")
+                sys.exit(-1)
+
+        SnakePlay.__init__(self,game,showGame,saveGame,seeds)
+
+    def init_grid(self):
+        self.map = SparseGrid(0)
+        self.food_map = SparseGrid(False)
+
+    @property
+    def food(self):
+        return list(self.food_map)
+
+    def add_food(self, y, x):
+        if not self.food_map[y,x]:
+            self.food_map[int(y),int(x)] = True
+            self.nFood += 1
+
+    def remove_food(self, y, x):
+        if self.food_map[y,x]:
+            del self.food_map[y,x]
+            self.nFood -= 1
+
+    def set_cell(self, y, x, value):
+        if value == 0:
+            self.map.pop((y,x), None)
+        else:
+            self.map[int(y),int(x)] = value
+
+    # There's no dense layer to gather from, the windows read the occupied cells, where
+    # the retracted tails are already cleared
+    def percept_layer(self, pad):
+        return None
+
+    def clear_percept(self, layer, pad, y, x):
+        pass
+
+    def percept_windows(self, layer, pad, heads, fieldOfVision, games=None):
+        heads = np.reshape(np.array(heads,dtype='int'),(-1,2))
+        offsets = np.arange(fieldOfVision) - fieldOfVision//2
+        rows = ((heads[:,0,None] + offsets) % self.game.gridSize).tolist()
+        cols = ((heads[:,1,None] + offsets) % self.game.gridSize).tolist()
+
+        windows = np.zeros((len(heads),fieldOfVision,fieldOfVision),dtype='int')
+        for n in range(len(heads)):
+            for i, y in enumerate(rows[n]):
+                for j, x in enumerate(cols[n]):
+                    if self.food_map[y,x]:
+                        windows[n,i,j] = 2
+                    elif self.map[y,x] != 0:
+                        windows[n,i,j] = np.sign(self.map[y,x])
+        return windows
+
+    def collisions(self, heads):
+        heads = np.reshape(np.array(heads,dtype='int'),(-1,2))
+        cells = heads[:,0]*self.game.gridSize + heads[:,1]
+        _, I, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        occupied = np.array([self.map[y,x] != 0 for y,x in heads.tolist()],dtype='bool')
+        return (counts[I] > 1) | occupied
+
+    # Place N pieces of food on free cells by rejection sampling - each draw is likely
+    # to hit a free cell as long as the grid is mostly empty
+    def place_food(self, heads, N=1):
+        placements = []
+
+        while len(placements) < N and len(self.map) + self.nFood < self.game.gridSize**2:
+            y,x = divmod(int(self.rnd.randint(self.game.gridSize**2)), self.game.gridSize)
+            if self.map[y,x] == 0 and not self.food_map[y,x]:
+                self.add_food(y,x)
+                placements += [(y,x)]
+
+        return placements
+
+    # Reset the avatars for a new game, placing each snake in its own region drawn at
+    # random, and put nFoods pieces of food on the grid
+    def spawn(self,players):
+
+        nRegions = self.game.gridSize//5
+        taken = set()
+
+        for k,player in enumerate(players):
+            for avatar in player.avatars:
+                avatar.reset_for_new_game(self.game.nTurns)
+
+                if len(taken) == nRegions**2:
+                    break
+
+                r = int(self.rnd.randint(nRegions**2))
+                while r in taken:
+                    r = int(self.rnd.randint(nRegions**2))
+                taken.add(r)
+
+                yr,xr = divmod(r, nRegions)
+                self.spawn_avatar(avatar,k,yr*5+2,xr*5+2)
+
+        self.place_food([], N=self.game.nFoods)
+
+
+# Layer of the grid packed into bits, each row into 64-bit words - with a spare word
+# at the end of the row, so that a run of bits can always be read from two words
+class BitLayer:
+
+    def __init__(self, gridSize):
+        self.gridSize = gridSize
+        self.words = np.zeros((gridSize, (gridSize+63)//64 + 1), dtype='<u8')
+
+    def __getitem__(self, cell):
+        y, x = cell
+        return bool((self.words[y, x >> 6] >> np.uint64(x & 63)) & np.uint64(1))
+
+    def __setitem__(self, cell, value):
+        y, x = cell
+        bit = np.uint64(1) << np.uint64(x & 63)
+        if value:
+            self.words[y, x >> 6] |= bit
+        else:
+            self.words[y, x >> 6] &= ~bit
+
+    # Bits of many cells at once
+    def test(self, ys, xs):
+        return test_bits(self.words, ys, xs)
+
+    # Unpacked boolean layer
+    def unpack(self):
+        return unpack_bits(self.words, self.gridSize)
+
+
+# Bits of cells (ys,xs) of packed rows
+def test_bits(words, ys, xs):
+    return ((words[ys, xs >> 6] >> (xs & 63).astype('uint64')) & np.uint64(1)).astype('bool')
+
+# Boolean layer of packed rows
+def unpack_bits(words, gridSize):
+    return np.unpackbits(words.view('uint8'), axis=1, bitorder='little')[:,:gridSize].astype('bool')
+
+# Number of bits set in each byte value
+byteBits = np.unpackbits(np.arange(256,dtype='uint8')[:,None],axis=1).sum(axis=1).astype('int')
+
+# Number of bits set in each of the packed rows
+def count_bits(words):
+    return byteBits[words.view('uint8')].sum(axis=1)
+
+# Runs of n bits (1 to 64) of rows ys starting at columns s, not wrapping around
+def read_bits(words, ys, s, n):
+    b = (s & 63).astype('uint64')
+    lo = words[ys, s >> 6] >> b
+    hi = (words[ys, (s >> 6) + 1] << np.uint64(1)) << (np.uint64(63) - b)
+    mask = ((np.uint64(1) << (n - 1).astype('uint64')) << np.uint64(1)) - np.uint64(1)
+    return (lo | hi) & mask
+
+# Field of vision windows around the given heads from packed rows, read a row of the
+# window (up to 64 columns) at a time with word shifts and masks, wrapping around the
+# edges of the grid
+def bit_windows(words, gridSize, heads, fieldOfVision):
+    heads = np.reshape(np.array(heads,dtype='int'),(-1,2))
+    offsets = np.arange(fieldOfVision) - fieldOfVision//2
+    rows = (heads[:,0,None] + offsets) % gridSize
+    windows = np.zeros((len(heads),fieldOfVision,fieldOfVision),dtype='bool')
+
+    for c in range(0, fieldOfVision, 64):
+        n = min(64, fieldOfVision - c)
+        s = np.broadcast_to(((heads[:,1] - fieldOfVision//2 + c) % gridSize)[:,None], np.shape(rows))
+
+        # Bits up to the right edge of the grid, then the ones wrapped around to the left
+        first = np.minimum(n, gridSize - s)
+        bits = read_bits(words, rows, s, first)
+        rest = n - first
+        wrapped = read_bits(words, rows, np.zeros_like(s), np.maximum(rest, 1))
+        bits |= np.where(rest > 0, wrapped << first.astype('uint64'), np.uint64(0))
+
+        windows[:,:,c:c+n] = (bits[:,:,None] >> np.arange(n,dtype='uint64')) & np.uint64(1)
+
+    return windows
+
+
+# Map of a bitboard game - a bit layer for the bodies of each player, read as 1 for
+# player 1, -1 for player 2 and 0 for empty cells
+class BitMap:
+
+    def __init__(self, gridSize):
+        self.players = [BitLayer(gridSize), BitLayer(gridSize)]
+
+    def __getitem__(self, cell):
+        if self.players[0][cell]:
+            return 1
+        elif self.players[1][cell]:
+            return -1
+        else:
+            return 0
+
+    def __setitem__(self, cell, value):
+        self.players[0][cell] = value > 0
+        self.players[1][cell] = value < 0
+
+
+# Game engine that plays like the default one with the bodies of each player and the
+# food packed into bit layers, 64 cells to a word. The percept layer is a copy of the
+# packed words, and the windows and collision tests read bits straight from them.
+# There's no free-cell index, food goes on a free cell found by counting the bits of
+# the rows that are free in all the layers.
+class BitboardSnakePlay(SnakePlay):
+
+    def init_grid(self):
+        self.map = BitMap(self.game.gridSize)
+        self.food_map = BitLayer(self.game.gridSize)
+
+    def update_free(self, y, x):
+        pass
+
+    # Packed rows of the cells that are neither occupied nor hold food
+    def free_words(self):
+        G = self.game.gridSize
+        words = ~(self.map.players[0].words | self.map.players[1].words | self.food_map.words)
+        words[:,(G+63)//64:] = 0
+        if G % 64 != 0:
+            words[:,G >> 6] &= (np.uint64(1) << np.uint64(G & 63)) - np.uint64(1)
+        return words
+
+    # Place N pieces of food on free cells - the r-th free cell in the order of the
+    # grid is found from the counts of free cells of the rows
+    def place_food(self, heads, N=1):
+        placements = []
+
+        free = self.free_words()
+        counts = count_bits(free)
+        ends = np.cumsum(counts)
+
+        for n in range(N):
+            if ends[-1] < 1:
+                break
+
+            r = self.rnd.randint(ends[-1])
+            y = int(np.searchsorted(ends, r, side='right'))
+            x = int(np.flatnonzero(unpack_bits(free[y:y+1], self.game.gridSize)[0])[r - ends[y] + counts[y]])
+            self.add_food(y,x)
+
+            free[y, x >> 6] &= ~(np.uint64(1) << np.uint64(x & 63))
+            counts[y] -= 1
+            ends[y:] -= 1
+
+            placements += [(y,x)]
+
+        return placements
+
+    @property
+    def food(self):
+        return [(y,x) for y,x in np.argwhere(self.food_map.unpack())]
+
+    # Copy of the packed words of the player and food layers
+    def percept_layer(self, pad):
+        return [layer.words.copy() for layer in self.map.players + [self.food_map]]
+
+    def clear_percept(self, layer, pad, y, x):
+        for words in layer[:2]:
+            words[y, x >> 6] &= ~(np.uint64(1) << np.uint64(x & 63))
+
+    def percept_windows(self, layer, pad, heads, fieldOfVision, games=None):
+        own, opponent, food = [bit_windows(words, self.game.gridSize, heads, fieldOfVision) for words in layer]
+        return np.where(food, 2, own.astype('int') - opponent)
+
+    def collisions(self, heads):
+        heads = np.reshape(np.array(heads,dtype='int'),(-1,2))
+        cells = heads[:,0]*self.game.gridSize + heads[:,1]
+        _, I, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        occupied = self.map.players[0].test(heads[:,0],heads[:,1]) | self.map.players[1].test(heads[:,0],heads[:,1])
+        return (counts[I] > 1) | occupied
+
+
+# Game engines that SnakeGame can play with
+engines = {'default': SnakePlay, 'arrays': ArraySnakePlay, 'tiles': TiledSnakePlay,
+           'sparse': SparseSnakePlay, 'bitboard': BitboardSnakePlay}
+
+
 
 # Class that runs the entire game
 class SnakeGame:
 
     # Initialises the game
-    def __init__(self, gridSize, nTurns, nFoods, nAgents, saveFinalGames=True,seed=None, tournament=False):
+    def __init__(self, gridSize, nTurns, nFoods, nAgents, saveFinalGames=True,seed=None, tournament=False, engine='default', trainingGames=1, nTiles=None, trainingWorkers=1,
+                 trainingIslands=1, migrationInterval=10, nMigrants=2, steadyState=False,
+                 headless=False, progressInterval=10, saveFormat='frames', checkpointInterval=0,
+                 resumeTraining=False, sandboxAgents=False):
 
         self.rnd = np.random.RandomState()
         self.gridSize = gridSize
@@ -1082,7 +2465,62 @@ class SnakeGame:
         self.nFoods = nFoods
         self.nAgents = nAgents
         self.saveFinalGames = saveFinalGames
-        self.rnd_fixed_seed = np.random.RandomState(seed)#game_rnd_seed)
+        # The seed can also be the seed of a child stream, such as that of an island
+        if isinstance(seed, np.random.SeedSequence):
+            self.rnd_fixed_seed = np.random.RandomState(np.random.MT19937(seed))
+            self.seeds = seed
+        else:
+            self.rnd_fixed_seed = np.random.RandomState(seed)#game_rnd_seed)
+            self.seeds = np.random.SeedSequence(seed)
+        self.engine = engines[engine]
+        self.engineName = engine
+        self.trainingGames = trainingGames
+        self.nTiles = nTiles
+        self.trainingWorkers = trainingWorkers
+        self.pool = None
+        self.trainingIslands = trainingIslands
+        self.migrationInterval = migrationInterval
+        self.nMigrants = nMigrants
+        self.migration = None
+        self.steadyState = steadyState
+        self.headless = headless
+        self.progressInterval = progressInterval
+        self.saveFormat = saveFormat
+        self.checkpointInterval = checkpointInterval
+        self.resumeTraining = resumeTraining
+        self.sandboxAgents = sandboxAgents
+        self.checkpoints = None
+
+        # Sandboxed agents are asked for the actions of all their snakes at once, which
+        # only the engines where all the snakes perceive the start of the turn allow
+        if sandboxAgents and engine not in ['arrays', 'tiles']:
+            if tournament:
+                raise RuntimeError("Error! Sandboxed agents need the 'arrays' or 'tiles' engine, where the snakes of both players perceive the start of the turn")
+            else:
+                print("Error! Sandboxed agents need the 'arrays' or 'tiles' engine, where the snakes of both players perceive the start of the turn")
+                sys.exit(-1)
+        self.progress_buffer = []
+        self.progress_time = time.monotonic()
+
+    # Write training progress; in headless mode it's collected and written out in one
+    # go at most every progressInterval seconds, without flushing
+    def progress(self,text,flush=False):
+        if not self.headless:
+            sys.stdout.write(text)
+            if flush:
+                sys.stdout.flush()
+            return
+
+        self.progress_buffer.append(text)
+        if time.monotonic() - self.progress_time >= self.progressInterval:
+            self.end_progress()
+
+    # Write out the progress collected in headless mode
+    def end_progress(self):
+        if len(self.progress_buffer) > 0:
+            sys.stdout.write("".join(self.progress_buffer))
+            self.progress_buffer = []
+        self.progress_time = time.monotonic()
 
     # Update the stats for the visualiser
     def update_vis_agents(self,players,creature_state):
@@ -1167,12 +2605,43 @@ class SnakeGame:
         else:
             saves = []
 
+        # Sandboxed agents play from worker processes of their own, kept for all the games
+        if self.sandboxAgents:
+            for player in self.players:
+                player.sandbox = AgentSandbox(player)
+
         self.play(self.players,shows,saves,visResolution,visSpeed,savePath)
 
+        for player in self.players:
+            if player.sandbox is not None:
+                player.sandbox.close()
+                player.sandbox = None
+
 
     def train(self,player,visResolution=(720,480), visSpeed='normal',savePath="saved",
-              trainers=[("random","randomPlayer"), ("hunter","hunterPlayer")]):
+              trainers=[("random","randomPlayer"), ("hunter","hunterPlayer")], save=True):
+
+        if self.trainingIslands > 1 and self.migration is None:
+            return self.train_islands(player, save)
 
+        # The pool, the checkpoints and the progress are wrapped up however the training
+        # ends
+        try:
+            return self.train_schedule(player, visResolution, visSpeed, savePath, save)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+
+            if self.checkpoints is not None:
+                self.checkpoints.close()
+                self.checkpoints = None
+
+            self.end_progress()
+
+    # Train the player through its trainingSchedule; returns the player, or None if the
+    # training failed
+    def train_schedule(self,player,visResolution,visSpeed,savePath,save):
         playerNumber = player.player
         trainingSchedule = player.trainingSchedule
 
@@ -1186,6 +2655,15 @@ class SnakeGame:
 
         gens_count = 0
 
+        # Checkpoints of the training are taken every checkpointInterval generations,
+        # and training can pick up from the last one
+        if self.checkpointInterval > 0 and self.migration is None and not self.steadyState:
+            self.checkpoints = Checkpointer(player.checkpointFile)
+
+        checkpoint = None
+        if self.resumeTraining:
+            checkpoint = Checkpointer.load(player)
+
         for op, gens in trainingSchedule:
 
             if gens_count + gens > tot_gens:
@@ -1194,6 +2672,11 @@ class SnakeGame:
             if gens==0:
                 break
 
+            # Steps of the schedule finished before the checkpoint are skipped
+            if checkpoint is not None and checkpoint['gens'] >= gens_count + gens:
+                gens_count += gens
+                continue
+
             if op == 'random':
                 opFile = 'random_agent.py'
             elif op == 'self':
@@ -1208,7 +2691,7 @@ class SnakeGame:
 
             if op == 'self':
                 #opponent = player
-                sys.stdout.write("\nTraining %s against self for %d generations...\n" % (player.name, gens))
+                self.progress("\nTraining %s against self for %d generations...\n" % (player.name, gens))
                 #players.append(opponent)
             elif op is not None:
                 try:
@@ -1227,14 +2710,35 @@ class SnakeGame:
                         self.game_messages[player.player] = player.errorMsg
                     return None
 
-                sys.stdout.write("\nTraining %s against %s for %d generations...\n" % (player.name, op, gens))
+                self.progress("\nTraining %s against %s for %d generations...\n" % (player.name, op, gens))
                 players.append(opponent)
             else:
-                sys.stdout.write("\nTraining %s in single-player mode for %d generations...\n" % (player.name, gens))
-            sys.stdout.write("------")
+                self.progress("\nTraining %s in single-player mode for %d generations...\n" % (player.name, gens))
+
+            # Pick up from the checkpoint, with the population, the opponent and the
+            # random streams as they were when it was taken
+            done = 0
+            if checkpoint is not None:
+                done = checkpoint['gens'] - gens_count
+                self.progress("Resuming from generation %d\n" % checkpoint['gens'])
+                Checkpointer.restore(self, checkpoint, players)
+                checkpoint = None
 
+            self.progress("------")
 
-            self.play(players,[], [], visResolution, visSpeed, savePath, trainGames=(gens,gens_count,tot_gens))
+
+            # The training games of each generation can be spread over worker processes
+            if self.trainingWorkers > 1 or self.steadyState:
+                self.pool = ProcessPoolExecutor(self.trainingWorkers)
+
+            if self.steadyState:
+                self.play_steady(players, trainGames=(gens-done,gens_count+done,tot_gens))
+            else:
+                self.play(players,[], [], visResolution, visSpeed, savePath, trainGames=(gens-done,gens_count+done,tot_gens))
+
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
 
 
             #if opFile == player.playerFile:
@@ -1263,6 +2767,13 @@ class SnakeGame:
             #        traceback.print_exc()
             #        sys.exit(-1)
 
+        if self.checkpoints is not None:
+            self.checkpoints.close()
+            self.checkpoints = None
+
+        if not save:
+            return player
+
         try:
             player.save_trained()
         except Exception as e:
@@ -1273,11 +2784,17 @@ class SnakeGame:
                 traceback.print_exc()
                 sys.exit(-1)
 
+        # The finished training doesn't need its checkpoint any more
+        if os.path.isfile(player.checkpointFile):
+            os.remove(player.checkpointFile)
+
         return player
 
     def play(self,players, show_games, save_games, visResolution=(720,480), visSpeed='normal',savePath="saved",trainGames=None):
 
-        if len(show_games)>0 and not self.in_tournament:
+        # Headless games are neither shown nor saved, so nothing is set up for the
+        # visualisation and pygame is never imported
+        if len(show_games)>0 and not self.in_tournament and not self.headless:
             import vis_pygame as vis
             playerStrings = []
             for p in players:
@@ -1304,20 +2821,36 @@ class SnakeGame:
                 sys.stdout.write("\n  Game %d..." % (game))
 
             else:
-                sys.stdout.write("\n  Gen %3d/%d..." % (game+gens_count, tot_gens))
+                self.progress("\n  Gen %3d/%d..." % (game+gens_count, tot_gens))
 
-            if trainGames is None and game in show_games and not self.in_tournament:
+            if trainGames is None and game in show_games and not self.in_tournament and not self.headless:
                 showGame = "Snakes on a plane!"
             else:
                 showGame = None
 
-            if trainGames is None and game in save_games:
+            if trainGames is None and game in save_games and not self.headless:
                 saveGame = True
             else:
                 saveGame = False
 
-            sgame = SnakePlay(self,showGame,saveGame)
-            gameResult = sgame.play(players)
+            # Every game has a stream of its own, the child of the stream of its
+            # generation - the games played after training are in generation 0
+            if trainGames is None:
+                seeds = [child_seed(self.seeds, 0, game)]
+            else:
+                seeds = [child_seed(self.seeds, game+gens_count, g) for g in range(self.trainingGames)]
+
+            # Training generations can be evaluated over several games, played in worker
+            # processes, in lockstep with the arrays engine or one after another with
+            # the other engines, all of which give the same results
+            if trainGames is not None and self.trainingGames > 1 and self.pool is None and self.engineName == 'arrays':
+                sgame = ArraySnakePlay(self,showGame,saveGame,nGames=self.trainingGames,seeds=seeds)
+                gameResult = sgame.play(players)
+            elif trainGames is not None and (self.pool is not None or self.trainingGames > 1):
+                gameResult = self.play_training_games(players, seeds)
+            else:
+                sgame = self.engine(self,showGame,saveGame,seeds=seeds)
+                gameResult = sgame.play(players)
 
             if gameResult is None:
                 if self.in_tournament:
@@ -1350,7 +2883,12 @@ class SnakeGame:
 
                 try:
                     if game + gens_count < tot_gens:
+                        if self.migration is not None:
+                            self.migration(players[0], game+gens_count)
+                        np.random.set_state(stream_state(child_seed(self.seeds, game+gens_count)))
                         players[0].new_generation_agents(game+gens_count)
+                        if self.checkpoints is not None and (game+gens_count) % self.checkpointInterval == 0:
+                            self.checkpoints.save(self, players, game+gens_count)
                     else:
                         players[0].evaluate_fitness()
                 except Exception as e:
@@ -1366,6 +2904,176 @@ class SnakeGame:
                 #vis_fh = sgame.vis_fh[:, :sgame.turn + 2]
 
 
+    # Settings for the games created in worker processes
+    def worker_settings(self):
+        return dict(gridSize=self.gridSize, nTurns=self.nTurns, nFoods=self.nFoods, nAgents=self.nAgents,
+                    tournament=self.in_tournament, engine=self.engineName, trainingGames=self.trainingGames,
+                    nTiles=self.nTiles, headless=self.headless, progressInterval=self.progressInterval)
+
+    # Steady-state training - the workers keep playing games with candidate populations
+    # bred by newGeneration from the current population, and as the results of each
+    # game come in, its agents compete with the population and the weakest are dropped;
+    # every game counts as a generation
+    def play_steady(self,players,trainGames):
+        gens, gens_count, tot_gens = trainGames
+        player = players[0]
+        settings = self.worker_settings()
+        opponents = [(p.player, p.playerFile, [avatar.agent for avatar in p.avatars]) for p in players[1:]]
+
+        # Each candidate is played with a stream keyed by the generation it was bred in
+        # and its number among the candidates of that generation
+        def submit(agents, gen, n):
+            return self.pool.submit(play_training_game, settings, [(player.player, player.playerFile, agents)] + opponents,
+                                    child_seed(self.seeds, gen, n))
+
+        # The current population is evaluated first
+        pending = {submit([avatar.agent for avatar in player.avatars], gens_count, 0)}
+        population = []
+
+        for game in range(1, gens + 1):
+            self.progress("\n  Gen %3d/%d..." % (game+gens_count, tot_gens))
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            pending |= done
+            result = future.result()
+
+            if isinstance(result, str):
+                self.game_messages[player.player] = result
+                self.game_play = False
+                return
+
+            try:
+                # Rank the candidates along with the population and keep the fittest
+                agents, sizes = result[0][0], result[1][0]
+                for agent, agentSizes in zip(agents, sizes):
+                    agent.sizes = agentSizes
+                player.agents_to_avatars(population + agents)
+                for avatar in player.avatars:
+                    avatar.sizes = avatar.agent.sizes
+                player.rank_avatars()
+                player.avatars = player.avatars[:self.nAgents]
+                population = [player.avatar_to_agent_stats(avatar) for avatar in player.avatars]
+
+                if game == gens:
+                    player.evaluate_fitness()
+                    break
+
+                # Keep all the workers busy with candidates bred from the population; the
+                # fitness of the population is recorded once for each finished game
+                np.random.set_state(stream_state(child_seed(self.seeds, game+gens_count)))
+                n = 0
+                while len(pending) < self.trainingWorkers:
+                    agents, fitness = player.breed_agents()
+                    if n == 0:
+                        player.record_fitness(fitness)
+                    pending.add(submit(agents, game+gens_count, n))
+                    n += 1
+
+            except Exception as e:
+                if self.in_tournament:
+                    self.game_scores[player.player] = -self.nAgents
+                    self.game_messages[player.player] = str(e)
+                    self.game_play = False
+                    return
+                else:
+                    traceback.print_exc()
+                    sys.exit(-1)
+
+    # Train the player's population on trainingIslands islands, each in a process of
+    # its own with its own seed and opponents, migrating the best agents between the
+    # islands every migrationInterval generations; the population of the island with
+    # the best final fitness is kept, along with its fitness history
+    def train_islands(self,player,save=True):
+        settings = self.worker_settings()
+
+        # The islands are a level of the hierarchy of streams between the run and the
+        # generations - the run doesn't train when it has islands
+        seeds = [child_seed(self.seeds, k) for k in range(self.trainingIslands)]
+
+        # The islands get copies of the files of the player and of its opponents
+        files = agent_files(self, player.playerFile)
+        for op, gens in player.trainingSchedule:
+            if op == 'random':
+                files += agent_files(self, 'random_agent.py')
+            elif op != 'self':
+                files += agent_files(self, op)
+
+        self.progress("\nTraining %s on %d islands (progress of island 1 shown)...\n" % (player.name, self.trainingIslands), flush=True)
+
+        with multiprocessing.Manager() as manager:
+            queues = [manager.Queue() for k in range(self.trainingIslands)]
+            islands = [Island(k, queues[k], queues[(k+1) % self.trainingIslands], self.migrationInterval, self.nMigrants)
+                       for k in range(self.trainingIslands)]
+
+            with ProcessPoolExecutor(self.trainingIslands) as pool:
+                try:
+                    results = list(pool.map(train_island, [settings]*len(islands), [player.player]*len(islands),
+                                            [player.playerFile]*len(islands), [files]*len(islands), seeds, islands))
+                except Exception as e:
+                    results = ["Error! An island process failed - %s" % repr(e)]
+
+        # The islands that stopped for want of migrants return None - the message is
+        # that of the island that failed
+        if not all(isinstance(result, tuple) for result in results):
+            messages = [result for result in results if isinstance(result, str)]
+            self.game_messages[player.player] = messages[0] if messages else \
+                "Error! The islands got no migrants in %d seconds" % migrationTimeout
+            return None
+
+        fitness = [result[0] for result in results]
+        best = int(np.argmax(fitness))
+        self.progress("\nIsland fitness: %s, keeping island %d\n" % (" ".join("%.2e" % f for f in fitness), best+1))
+
+        player.agents_to_avatars(results[best][1])
+
+        # The fitness history of the island that's kept, and what its agent wrote to
+        # fitnesses.txt
+        player.fitness += results[best][2]
+        if results[best][3]:
+            with open("fitnesses.txt", "a") as f:
+                f.write(results[best][3])
+
+        if save:
+            try:
+                player.save_trained()
+            except Exception as e:
+                if self.in_tournament:
+                    self.game_messages[player.player] = "Error! Failed to save training results."
+                    return None
+                else:
+                    traceback.print_exc()
+                    sys.exit(-1)
+
+        self.end_progress()
+        return player
+
+    # Play trainingGames games with different seeds, on the worker processes or one
+    # after another, each with copies of the players' agents, and merge their results
+    # into the players - the stats the agents recorded themselves and the size stats,
+    # both with the games one after another
+    def play_training_games(self,players,seeds):
+        settings = self.worker_settings()
+        agents = [(player.player, player.playerFile, [avatar.agent for avatar in player.avatars]) for player in players]
+
+        if self.pool is not None:
+            results = list(self.pool.map(play_training_game, [settings]*len(seeds), [agents]*len(seeds), seeds))
+        else:
+            results = [play_training_game(settings, copy.deepcopy(agents), seed) for seed in seeds]
+
+        for result in results:
+            if isinstance(result, str):
+                self.game_messages[players[0].player] = result
+                self.game_play = False
+                return None
+
+        for k, player in enumerate(players):
+            merge_agents([avatar.agent for avatar in player.avatars], [agents[k] for agents, _, _ in results])
+            for n, avatar in enumerate(player.avatars):
+                avatar.sizes = np.concatenate([sizes[k][n] for _, sizes, _ in results])
+
+        return [score for _, _, score in results]
+
     # Play visualisation of a saved game
     @staticmethod
     def load(loadGame,visResolution=(720,480), visSpeed='normal'):
@@ -1375,26 +3083,283 @@ class SnakeGame:
             print("Error! Saved game file '%s' not found." % loadGame)
             sys.exit(-1)
 
-        # Open the game file and read data
+        # Streamed games are read a frame at a time, seeking from the nearest keyframe
+        if replay_format(loadGame) == 'stream':
+            import replay
+            stream = replay.FrameStreamReader(loadGame)
+            v = vis.visualiser(speed=visSpeed, playerStrings=stream.players, resolution=visResolution)
+
+            titleStr = "Snakes on a plane! %s" % os.path.basename(loadGame)
+            for t in range(len(stream)):
+                v.show(stream.frame(t), turn=t, titleStr=titleStr)
+            return
+
+        # Open the game file and read data - either the frames of the game or the log of
+        # its actions
         try:
             with gzip.open(loadGame) as f:
-              (player1Name,player2Name,vis_map) = pickle.load(f)
+              data = pickle.load(f)
         except:
             print("Error! Failed to load %s." % loadGame)
+            sys.exit(-1)
 
-        playerStrings = [player1Name]
-        if player2Name is not None:
-            playerStrings += [player2Name]
+        if isinstance(data, dict):
+            playerStrings = data['players']
+        else:
+            (player1Name,player2Name,vis_map) = data
+
+            playerStrings = [player1Name]
+            if player2Name is not None:
+                playerStrings += [player2Name]
 
         # Create an instance of visualiser
         v = vis.visualiser(speed=visSpeed, playerStrings=playerStrings,resolution=visResolution)
 
-        # Show visualisation
+        # Show visualisation, re-simulating the game from an action log as it goes
         titleStr = "Snakes on a plane! %s" % os.path.basename(loadGame)
+        if isinstance(data, dict):
+            import replay
+            replay.replay_actions(data, v, titleStr)
+            return
+
         for t in range(vis_map.shape[3]):
             v.show(vis_map[:,:,:,t], turn=t, titleStr=titleStr)
 
 
+# Checkpoints of the training of a player - the population and the opponent's agents,
+# the number of generations done, the fitness history and the states of the random
+# streams. The state is pickled when the checkpoint is taken, and it's compressed and
+# written out by a background thread while the training goes on.
+class Checkpointer:
+
+    def __init__(self, checkpointFile):
+        self.checkpointFile = checkpointFile
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write, daemon=True)
+        self.thread.start()
+
+    # Take a checkpoint after gens generations
+    def save(self, game, players, gens):
+        checkpoint = dict()
+        checkpoint['playerFile'] = players[0].playerFile
+        checkpoint['trainingSchedule'] = players[0].trainingSchedule
+        checkpoint['gens'] = gens
+        checkpoint['agents'] = [avatar.agent for avatar in players[0].avatars]
+        checkpoint['opponent'] = [avatar.agent for avatar in players[1].avatars] if len(players) > 1 else None
+        checkpoint['fitness'] = players[0].fitness
+        checkpoint['np_random'] = np.random.get_state()
+        checkpoint['rnd'] = game.rnd.get_state()
+        checkpoint['rnd_fixed_seed'] = game.rnd_fixed_seed.get_state()
+
+        self.queue.put(pickle.dumps(checkpoint))
+
+    # Write the checkpoints out as they come, replacing the previous one
+    def write(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+
+            with gzip.open(self.checkpointFile + '.tmp', 'w') as f:
+                f.write(data)
+            os.replace(self.checkpointFile + '.tmp', self.checkpointFile)
+
+    # Wait for the checkpoints to be written
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    # The last checkpoint of the player's training, if there's one for its schedule
+    @staticmethod
+    def load(player):
+        if not os.path.isfile(player.checkpointFile):
+            return None
+
+        try:
+            with gzip.open(player.checkpointFile) as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            print("Error! Failed to load checkpoint %s, training from the start." % player.checkpointFile)
+            return None
+
+        if checkpoint['playerFile'] != player.playerFile or checkpoint['trainingSchedule'] != player.trainingSchedule:
+            print("Warning! Checkpoint %s is for a different training schedule, training from the start." % player.checkpointFile)
+            return None
+
+        return checkpoint
+
+    # Put the players and the random streams back in the state of the checkpoint
+    @staticmethod
+    def restore(game, checkpoint, players):
+        players[0].agents_to_avatars(checkpoint['agents'])
+        players[0].fitness = checkpoint['fitness']
+        if checkpoint['opponent'] is not None and len(players) > 1:
+            players[1].agents_to_avatars(checkpoint['opponent'])
+
+        np.random.set_state(checkpoint['np_random'])
+        game.rnd.set_state(checkpoint['rnd'])
+        game.rnd_fixed_seed.set_state(checkpoint['rnd_fixed_seed'])
+
+
+# Format of a saved game file, told by its first bytes - 'stream' for streamed
+# games and 'pickle' for the gzipped frames or action logs
+def replay_format(loadGame):
+    import replay
+    with open(loadGame, 'rb') as f:
+        if f.read(len(replay.streamMagic)) == replay.streamMagic:
+            return 'stream'
+    return 'pickle'
+
+
+# Migration between the islands of the island model - every interval generations an
+# island sends copies of its nMigrants best agents to the next island and replaces its
+# weakest agents with the ones from the previous island, which come with the stats of
+# their last game. An island that fails sends None instead, and the islands waiting
+# for its migrants pass it on and stop, as they do when none come in migrationTimeout.
+class Island:
+
+    def __init__(self, island, inbox, outbox, interval, nMigrants):
+        self.island = island
+        self.inbox = inbox
+        self.outbox = outbox
+        self.interval = interval
+        self.nMigrants = nMigrants
+        self.stopped = False
+
+    def __call__(self, player, gen):
+        if gen % self.interval != 0 or self.nMigrants < 1:
+            return
+
+        player.rank_avatars()
+        self.outbox.put([avatar.agent for avatar in player.avatars[:self.nMigrants]])
+
+        try:
+            migrants = self.inbox.get(timeout=migrationTimeout)
+        except queue.Empty:
+            migrants = None
+
+        if migrants is None:
+            self.stopped = True
+            self.abort()
+            raise RuntimeError("Error! Island %d got no migrants from the previous island" % (self.island+1))
+
+        for n, agent in enumerate(migrants, start=len(player.avatars)-self.nMigrants):
+            avatar = Avatar(agent, player=player)
+            avatar.sizes = agent.sizes
+            player.avatars[n] = avatar
+
+    # Let the next island know that no more migrants will come from this one
+    def abort(self):
+        self.outbox.put(None)
+
+
+# Train a population on an island in a worker process; returns the mean fitness, the
+# agents of the final population, the fitness history and what the agent wrote to
+# fitnesses.txt - or an error message, or None if the island stopped for want of
+# migrants. Each island plays in a folder of its own, with copies of the given files
+# of the agents' folder, so that the agents of the islands don't write to the same files.
+def train_island(settings, playerNumber, playerFile, files, seed, island):
+    agentPath = os.getcwd()
+    islandPath = tempfile.mkdtemp(prefix="island%d-" % (island.island+1))
+
+    try:
+        for f in files:
+            if os.path.isfile(f):
+                os.makedirs(os.path.join(islandPath, os.path.dirname(f)), exist_ok=True)
+                shutil.copy2(f, os.path.join(islandPath, f))
+        sys.path.insert(0, agentPath)
+        os.chdir(islandPath)
+
+        np.random.set_state(stream_state(seed))
+
+        # Only the progress of the first island is shown
+        if island.island > 0:
+            sys.stdout = open(os.devnull, 'w')
+
+        game = SnakeGame(saveFinalGames=False, seed=seed, **settings)
+        game.game_messages = ['', '']
+        game.game_scores = [0, 0]
+        game.game_saves = list()
+        game.migration = island
+
+        player = Player(game, playerNumber, playerFile)
+        if not player.ready:
+            island.abort()
+            return player.errorMsg
+
+        player = game.train(player, save=False)
+        if player is None:
+            island.abort()
+            return None if island.stopped else game.game_messages[playerNumber]
+
+        fitness = player.rank_avatars()
+
+        log = ""
+        if os.path.isfile("fitnesses.txt"):
+            with open("fitnesses.txt") as f:
+                log = f.read()
+
+        return np.mean(fitness), [avatar.agent for avatar in player.avatars], player.fitness, log
+
+    # The islands waiting for migrants from this one mustn't wait forever
+    except BaseException as e:
+        island.abort()
+        return None if island.stopped else "Error! Island %d failed - %s" % (island.island+1, repr(e))
+
+    finally:
+        os.chdir(agentPath)
+        shutil.rmtree(islandPath, ignore_errors=True)
+
+
+# Player of a training game with the given agents - the agent file was checked when
+# the player was first loaded, so only its module is imported here, and no agents are
+# created or loaded just to be swapped for the given ones
+def training_player(game, k, playerFile, agents):
+    player = Player(game, k, playerFile, emptyMode=True)
+    player.exec = importlib.import_module(playerFile[:-3])
+    if game.in_tournament:
+        player.name = playerFile[:-3].split('.')[-1]
+    else:
+        player.name = getattr(player.exec, 'agentName', playerFile)
+    player.fieldOfVision = int(player.exec.perceptFieldOfVision)
+    player.nFrames = int(player.exec.perceptFrames)
+    player.batch = hasattr(player.exec, 'AgentFunctionBatch')
+    player.trainingSchedule = player.exec.trainingSchedule
+    player.agents_to_avatars(agents)
+    player.ready = True
+    return player
+
+
+# Files of an agent in its folder - the agent file and the population saved by training
+def agent_files(game, playerFile):
+    agentFile = playerFile[:-3]
+    if game.in_tournament:
+        agentFile = agentFile.replace('.', '/')
+    return [playerFile, agentFile + '.tar.gz']
+
+
+# Play a training game in a worker process or in the main one, with the players
+# recreated from their files and given agents and the game's streams, the global one
+# included, seeded with seed; returns the agents and the size stats of each player,
+# and the score
+def play_training_game(settings, agents, seed):
+    np.random.set_state(stream_state(seed))
+
+    game = SnakeGame(saveFinalGames=False, **settings)
+    game.game_messages = ['', '']
+    game.game_scores = [0, 0]
+    game.game_saves = list()
+
+    players = [training_player(game, player, playerFile, playerAgents) for player, playerFile, playerAgents in agents]
+
+    score = game.engine(game,None,False,seeds=[seed]).play(players)
+    if score is None:
+        return game.game_messages[0] or game.game_messages[1]
+
+    return ([[avatar.agent for avatar in player.avatars] for player in players],
+            [[avatar.sizes for avatar in player.avatars] for player in players], score)
+
+
 def main(argv):
     # Load the defaults
     from settings import game_settings
@@ -1479,6 +3444,38 @@ def main(argv):
         print("Error! Invalid setting '%s' for visualisation speed.  Valid choices are 'slow','normal',fast'" % game_settings['visSpeed'])
         sys.exit(-1)
 
+    if game_settings['trainingGames'] < 1:
+        print("Error! Invalid setting '%s' for the number of training games.  It must be at least 1" % game_settings['trainingGames'])
+        sys.exit(-1)
+
+    if game_settings['trainingWorkers'] < 1:
+        print("Error! Invalid setting '%s' for the number of training workers.  It must be at least 1" % game_settings['trainingWorkers'])
+        sys.exit(-1)
+
+    if game_settings['trainingIslands'] < 1:
+        print("Error! Invalid setting '%s' for the number of training islands.  It must be at least 1" % game_settings['trainingIslands'])
+        sys.exit(-1)
+
+    if game_settings['steadyState'] and game_settings['trainingIslands'] > 1:
+        print("Error! Steady-state training can't be combined with training islands.")
+        sys.exit(-1)
+
+    if game_settings['saveFormat'] not in ['frames', 'actions', 'stream']:
+        print("Error! Invalid setting '%s' for the save format.  Valid choices are 'frames','actions','stream'" % game_settings['saveFormat'])
+        sys.exit(-1)
+
+    if game_settings['engine'] == 'sparse' and game_settings['saveFormat'] == 'frames':
+        print("Error! Games of the 'sparse' engine can't be saved as frames, which take the whole grid for every turn.  Save them as 'actions' or 'stream'")
+        sys.exit(-1)
+
+    if game_settings['checkpointInterval'] < 0:
+        print("Error! Invalid setting '%s' for the checkpoint interval.  It must be 0 (no checkpoints) or more" % game_settings['checkpointInterval'])
+        sys.exit(-1)
+
+    if game_settings['engine'] not in engines:
+        print("Error! Invalid setting '%s' for engine.  Valid choices are %s" % (game_settings['engine'], ", ".join("'%s'" % e for e in engines)))
+        sys.exit(-1)
+
     if not 'player1' in game_settings and not 'player2' in game_settings:
         print("Error! At least one player agent must be specified in settings.py.")
         sys.exit(-1)
@@ -1495,7 +3492,21 @@ def main(argv):
                 nTurns=game_settings['nTurns'],nFoods=game_settings['nSnakes'],
                 nAgents=game_settings['nSnakes'],
                 saveFinalGames=game_settings['saveFinalGames'],
-                seed=game_settings['seed'])
+                seed=game_settings['seed'],
+                engine=game_settings['engine'],
+                trainingGames=game_settings['trainingGames'],
+                nTiles=game_settings['nTiles'],
+                trainingWorkers=game_settings['trainingWorkers'],
+                trainingIslands=game_settings['trainingIslands'],
+                migrationInterval=game_settings['migrationInterval'],
+                nMigrants=game_settings['nMigrants'],
+                steadyState=game_settings['steadyState'],
+                headless=game_settings['headless'],
+                progressInterval=game_settings['progressInterval'],
+                saveFormat=game_settings['saveFormat'],
+                checkpointInterval=game_settings['checkpointInterval'],
+                resumeTraining=game_settings['resumeTraining'],
+                sandboxAgents=game_settings['sandboxAgents'])
 
     g.run(game_settings['player1'],
           game_settings['player2'],
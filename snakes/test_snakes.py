@@ -0,0 +1,380 @@
+import os, shutil
+import numpy as np
+import pytest
+
+import snakes
+
+agentPath = os.path.dirname(os.path.abspath(__file__))
+
+# Perceptron agent with random weights and no training, for games whose agents only
+# need to act deterministically on their percepts
+agentSource = """import numpy as np
+
+agentName = "%s"
+perceptFieldOfVision = %d
+perceptFrames = %d
+trainingSchedule = None
+
+class Snake:
+    def __init__(self, nPercepts, actions):
+        self.actions = actions
+        self.weights = np.random.randn(len(actions), nPercepts)
+
+    def AgentFunction(self, percepts):
+        return self.actions[int(np.argmax(self.weights @ percepts.flatten()))]
+
+def newGeneration(old_population):
+    return old_population, np.zeros(len(old_population))
+"""
+
+batchSource = """
+def AgentFunctionBatch(agents, percepts):
+    return np.array([agent.AgentFunction(p) for agent, p in zip(agents, percepts)])
+"""
+
+
+# Write a perceptron agent to the folder, optionally with AgentFunctionBatch
+def write_agent(folder, name, fieldOfVision, nFrames, batch=False):
+    with open(os.path.join(folder, name + '.py'), 'w') as f:
+        f.write(agentSource % (name, fieldOfVision, nFrames) + (batchSource if batch else ""))
+    return name + '.py'
+
+
+# A game of the settings with the messages and saves set up as the game loop does
+def new_game(**settings):
+    game = snakes.SnakeGame(saveFinalGames=False, headless=True, **settings)
+    game.game_messages = ['', '']
+    game.game_scores = [0, 0]
+    game.game_saves = list()
+    return game
+
+
+# Train my_agent against random_agent for a few generations in a scratch folder and
+# return the average fitness of every generation and the final fitness
+def train(folder, monkeypatch, engine, trainingWorkers, trainingGames=3):
+    os.makedirs(folder)
+    for agentFile in ('my_agent.py', 'random_agent.py'):
+        shutil.copy(os.path.join(agentPath, agentFile), folder)
+    monkeypatch.chdir(folder)
+    monkeypatch.syspath_prepend(str(folder))
+
+    game = snakes.SnakeGame(gridSize=30, nTurns=30, nFoods=10, nAgents=10, saveFinalGames=False, seed=3,
+                            engine=engine, trainingGames=trainingGames, trainingWorkers=trainingWorkers,
+                            headless=True)
+    game.game_messages = ['', '']
+    game.game_scores = [0, 0]
+
+    np.random.seed(0)
+    player = snakes.Player(game, 0, 'my_agent.py')
+    player.trainingSchedule = [('random', 4)]
+    player = game.train(player, save=False)
+    assert player is not None
+
+    return player.fitness, player.rank_avatars()
+
+
+# The training games of a generation give the same fitness whether they're played in
+# the main process or spread over worker processes
+@pytest.mark.parametrize('engine', ['default', 'arrays'])
+def test_training_fitness_does_not_depend_on_workers(tmp_path, monkeypatch, engine):
+    sequential = train(tmp_path / 'sequential', monkeypatch, engine, 1)
+    workers = train(tmp_path / 'workers', monkeypatch, engine, 3)
+
+    assert sequential == workers
+
+
+# A streamed game that was cut short before its index was written reads back the
+# frames that made it to disk
+def test_stream_cut_short_reads_back(tmp_path, monkeypatch):
+    import replay
+
+    shutil.copy(os.path.join(agentPath, 'random_agent.py'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    game = snakes.SnakeGame(gridSize=30, nTurns=40, nFoods=10, nAgents=10, saveFinalGames=False, seed=3,
+                            saveFormat='stream', headless=True)
+    game.game_messages = ['', '']
+    game.game_saves = list()
+
+    np.random.seed(0)
+    players = [snakes.Player(game, 0, 'random_agent.py')]
+    game.engine(game, None, True).play(players)
+
+    stream = replay.FrameStreamReader(game.game_saves[0])
+    frames = [stream.frame(t).copy() for t in range(len(stream))]
+    index = stream.offsets
+    stream.close()
+
+    # Cut the file in the middle of the record of a frame
+    with open(game.game_saves[0], 'rb') as f:
+        data = f.read()
+    cut = tmp_path / 'cut.stream'
+    cut.write_bytes(data[:int(index[-3])+5])
+
+    stream = replay.FrameStreamReader(str(cut))
+    assert len(stream) == len(frames) - 3
+    for t in reversed(range(len(stream))):
+        assert np.array_equal(stream.frame(t), frames[t])
+    stream.close()
+
+
+# The default engine calls AgentFunction snake by snake, so that every snake sees the
+# moves made before it in the turn, whether or not the agent has AgentFunctionBatch
+def test_default_engine_ignores_batch_hook(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(agentPath, 'random_agent.py'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    results = []
+    for name, batch in (('plain', False), ('batched', True)):
+        game = new_game(gridSize=20, nTurns=60, nFoods=8, nAgents=8, seed=5)
+
+        np.random.seed(0)
+        players = [snakes.Player(game, 0, write_agent(tmp_path, name, 5, 2, batch)),
+                   snakes.Player(game, 1, 'random_agent.py')]
+        assert players[0].batch == batch
+
+        score = game.engine(game, None, False).play(players)
+        results.append((score, [avatar.actions.tolist() for player in players for avatar in player.avatars]))
+
+    assert results[0] == results[1]
+
+
+# The tournament watchdog only times out the agents - going off while the engine
+# moves the snakes doesn't end the game
+def test_watchdog_spares_engine_work(tmp_path, monkeypatch):
+    import time
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(snakes, 'agentTimeBudget', 0.1)
+
+    move_avatar = snakes.SnakePlay.move_avatar
+    def slow_move_avatar(self, *args):
+        time.sleep(0.2)
+        return move_avatar(self, *args)
+    monkeypatch.setattr(snakes.SnakePlay, 'move_avatar', slow_move_avatar)
+
+    game = new_game(gridSize=20, nTurns=2, nFoods=8, nAgents=8, seed=5, tournament=True)
+
+    np.random.seed(0)
+    players = [snakes.Player(game, k, write_agent(tmp_path, 'agent%d' % k, 5, 2)) for k in range(2)]
+    score = game.engine(game, None, False, seeds=[game.seeds]).play(players)
+
+    assert score is not None
+    assert game.game_messages == ['', '']
+
+
+# The tiles engine plays out a game exactly as the arrays engine does, however many
+# strips the grid is split into
+@pytest.mark.parametrize('nTiles', [1, 3, 16])
+def test_tiles_engine_matches_arrays(tmp_path, monkeypatch, nTiles):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    results = []
+    for engine in ('arrays', 'tiles'):
+        game = new_game(gridSize=25, nTurns=40, nFoods=6, nAgents=6, seed=5, engine=engine, nTiles=nTiles)
+
+        np.random.seed(0)
+        players = [snakes.Player(game, 0, write_agent(tmp_path, 'wide', 9, 3)),
+                   snakes.Player(game, 1, write_agent(tmp_path, 'narrow', 3, 1))]
+        score = game.engine(game, None, False, seeds=[game.seeds]).play(players)
+        results.append((score, [avatar.actions.tolist() for player in players for avatar in player.avatars],
+                        [avatar.sizes.tolist() for player in players for avatar in player.avatars]))
+
+    assert results[0] == results[1]
+
+
+# Sandboxed agents are rejected by the game itself on the engines where the snakes
+# of a turn don't all perceive its start, however the game is made
+@pytest.mark.parametrize('engine', ['default', 'sparse', 'bitboard'])
+def test_sandbox_needs_batch_engine(engine):
+    with pytest.raises(RuntimeError):
+        new_game(gridSize=20, nTurns=10, nFoods=8, nAgents=8, engine=engine, tournament=True, sandboxAgents=True)
+    with pytest.raises(SystemExit):
+        new_game(gridSize=20, nTurns=10, nFoods=8, nAgents=8, engine=engine, sandboxAgents=True)
+
+
+# The sparse engine doesn't save its games as frames, which would take a dense copy
+# of the grid for every turn
+def test_sparse_engine_rejects_frames():
+    game = new_game(gridSize=20, nTurns=10, nFoods=8, nAgents=8, engine='sparse', tournament=True)
+    with pytest.raises(RuntimeError):
+        game.engine(game, None, True)
+
+    game = new_game(gridSize=20, nTurns=10, nFoods=8, nAgents=8, engine='sparse', tournament=True, saveFormat='actions')
+    assert not hasattr(game.engine(game, None, True), 'vis_map')
+
+
+# The catalog rebuilt from the saved folder lists every game saved there - the games
+# saved within the same second included - with the entries of the action logs just as
+# they were when the games were saved
+def test_rebuilt_catalog_lists_saved_games(tmp_path, monkeypatch):
+    import replay
+
+    shutil.copy(os.path.join(agentPath, 'random_agent.py'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    for saveFormat in ('frames', 'actions', 'stream', 'actions'):
+        game = new_game(gridSize=20, nTurns=30, nFoods=8, nAgents=8, seed=5, saveFormat=saveFormat)
+        players = [snakes.Player(game, k, 'random_agent.py') for k in range(2)]
+        game.engine(game, None, True).play(players)
+
+    saved = replay.read_catalog("saved")
+    assert len(set(entry['file'] for entry in saved)) == 4
+
+    os.remove(os.path.join("saved", replay.catalogFile))
+    rebuilt = replay.rebuild_catalog("saved")
+    assert sorted(entry['file'] for entry in rebuilt) == sorted(entry['file'] for entry in saved)
+    assert replay.read_catalog("saved") == rebuilt
+
+    rebuilt = dict((entry['file'], entry) for entry in rebuilt)
+    for entry in saved:
+        entry.pop('date')
+        scanned = rebuilt[entry['file']]
+        scanned.pop('date')
+        if entry['format'] == 'actions':
+            assert scanned == entry
+        else:
+            for key in ('format', 'players', 'turns', 'gridSize', 'nAgents', 'bytes', 'offset'):
+                assert scanned[key] == entry[key]
+
+
+# Percepts of a snake as the original engine made them - its window of the grid read
+# cell by cell with wraparound, 1 for its own player's snakes, -1 for the opponent's
+# and 2 for food, then rotated to its frame of reference along with its remembered
+# frames
+def baseline_percepts(sgame, avatar, k, memory):
+    fieldOfVision = avatar.player.fieldOfVision
+    half = fieldOfVision // 2
+    gridSize = sgame.game.gridSize
+
+    window = np.zeros((fieldOfVision, fieldOfVision), dtype='int')
+    for i, io in enumerate(range(-half, half+1)):
+        for j, jo in enumerate(range(-half, half+1)):
+            y = (avatar.head[0] + io) % gridSize
+            x = (avatar.head[1] + jo) % gridSize
+            if sgame.map[y,x] != 0:
+                window[i,j] = (1 if k == 0 else -1) * np.sign(sgame.map[y,x])
+            if sgame.food_map[y,x]:
+                window[i,j] = 2
+
+    memory[-1] = window
+    return np.array([snakes.percepts_global_to_agent_frame_of_reference(frame, avatar.rotation) for frame in memory])
+
+
+# Move of the remembered frames for each action and rotation in the original engine
+baselineShifts = {(1, 0): (0, 1), (1, 90): (1, 0), (1, 180): (0, -1), (1, 270): (-1, 0),
+                  (-1, 0): (0, -1), (-1, 90): (-1, 0), (-1, 180): (0, 1), (-1, 270): (1, 0),
+                  (0, 0): (1, 0), (0, 90): (0, 1), (0, 180): (-1, 0), (0, 270): (0, -1)}
+
+
+# Shift the remembered frames of a snake after its move as the original engine did,
+# each into the slot of the frame before it
+def baseline_shift(memory, y, x):
+    for f in range(1, len(memory)):
+        frame = np.zeros_like(memory[f])
+        if y == 1:
+            frame[:-1,:] = memory[f][1:,:]
+        elif y == -1:
+            frame[1:,:] = memory[f][:-1,:]
+        elif x == 1:
+            frame[:,:-1] = memory[f][:,1:]
+        else:
+            frame[:,1:] = memory[f][:,:-1]
+        memory[f-1] = frame
+
+
+# The default engine gives every snake the percepts the original cell by cell loop
+# gave it, remembered frames included, and scores the game as the original did
+def test_default_engine_matches_baseline_percepts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    game = new_game(gridSize=20, nTurns=60, nFoods=8, nAgents=8, seed=5)
+    sgame = game.engine(game, None, False)
+
+    memories = dict()
+    calls = []
+    action = snakes.Avatar.action
+    def checked_action(avatar, turn, percepts):
+        k = avatar.player.player
+        memory = memories.setdefault(id(avatar), np.zeros_like(percepts))
+        assert np.array_equal(percepts, baseline_percepts(sgame, avatar, k, memory))
+
+        a = action(avatar, turn, percepts)
+        baseline_shift(memory, *baselineShifts[(a, avatar.rotation)])
+        calls.append(k)
+        return a
+    monkeypatch.setattr(snakes.Avatar, 'action', checked_action)
+
+    np.random.seed(0)
+    players = [snakes.Player(game, 0, write_agent(tmp_path, 'wide', 9, 4)),
+               snakes.Player(game, 1, write_agent(tmp_path, 'narrow', 5, 2))]
+    score = sgame.play(players)
+
+    assert len(set(calls)) == 2
+    assert score == int(sum(np.max(avatar.sizes) for avatar in players[0].avatars)) - \
+                    int(sum(np.max(avatar.sizes) for avatar in players[1].avatars))
+
+
+# Play a game of the settings between two perceptron agents, saved in the given
+# format; returns the saved file
+def play_saved_game(folder, saveFormat, **settings):
+    game = new_game(gridSize=20, nTurns=40, nFoods=8, nAgents=8, seed=5, saveFormat=saveFormat, **settings)
+
+    np.random.seed(0)
+    players = [snakes.Player(game, 0, write_agent(folder, 'wide', 9, 3)),
+               snakes.Player(game, 1, write_agent(folder, 'narrow', 3, 1))]
+    game.engine(game, None, True).play(players)
+    return game.game_saves[-1]
+
+
+# Frames of a game saved as frames, up to the last one drawn
+def saved_frames(saveFile):
+    import gzip, pickle
+
+    with gzip.open(saveFile) as f:
+        vis_map = pickle.load(f)[2]
+    drawn = [t for t in range(vis_map.shape[3]) if vis_map[:,:,:,t].any()]
+    return vis_map[:,:,:,:drawn[-1]+1]
+
+
+# A game saved as an action log replays to the frames of the same game saved as frames
+@pytest.mark.parametrize('engine', ['default', 'arrays'])
+def test_action_log_replays_saved_frames(tmp_path, monkeypatch, engine):
+    import gzip, pickle
+    import replay
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    frames = saved_frames(play_saved_game(tmp_path, 'frames', engine=engine))
+    with gzip.open(play_saved_game(tmp_path, 'actions', engine=engine)) as f:
+        data = pickle.load(f)
+
+    assert np.array_equal(replay.replay_frames(data), frames)
+
+
+# A streamed game reads back as the frames of the same game saved as frames, whether
+# its frames are read in order or out of it
+@pytest.mark.parametrize('engine', ['default', 'arrays'])
+def test_stream_reads_back_saved_frames(tmp_path, monkeypatch, engine):
+    import replay
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    frames = saved_frames(play_saved_game(tmp_path, 'frames', engine=engine))
+    reader = replay.FrameStreamReader(play_saved_game(tmp_path, 'stream', engine=engine))
+    try:
+        assert len(reader) == frames.shape[3]
+        for t in range(len(reader)):
+            assert np.array_equal(reader.frame(t), frames[:,:,:,t])
+        for t in reversed(range(len(reader))):
+            assert np.array_equal(reader.frame(t), frames[:,:,:,t])
+    finally:
+        reader.close()
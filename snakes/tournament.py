@@ -0,0 +1,252 @@
+import numpy as np
+import sys, os, getopt, csv, importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import snakes
+
+# Round-robin tournament between the agents in a folder - every pair of agents plays a
+# number of games, each with its own seed and with the agents swapping sides from one
+# game to the next. The games are played in tournament mode in a pool of worker
+# processes. Agents with a trainingSchedule and no saved population are trained first,
+# also in the pool, and the others play with the populations saved in their .tar.gz
+# files - agents trained against 'random' need random_agent.py in the folder, where it
+# plays in the tournament as well. The standings are written to a CSV table, with the
+# error messages of the agents, and the results of the games to another one next to it.
+
+
+# Worker processes play from the folder of the agents, so that they can be imported
+def enter_folder(agentPath):
+    os.chdir(agentPath)
+    if agentPath not in sys.path:
+        sys.path.insert(0, agentPath)
+
+
+# Agent files of the folder
+def agent_files(agentPath):
+    return sorted(f for f in os.listdir(agentPath) if f.endswith('.py') and f != '__init__.py')
+
+
+# A new game in tournament mode
+def tournament_game(settings, seed):
+    np.random.seed(seed)
+
+    game = snakes.SnakeGame(saveFinalGames=False, seed=seed, tournament=True, headless=True, **settings)
+    game.game_messages = ['', '']
+    game.game_scores = [0, 0]
+    game.game_saves = list()
+    return game
+
+
+# Train an agent and save its population; returns the error message, if any
+def train_agent(settings, playerFile, seed):
+    game = tournament_game(settings, seed)
+
+    player = snakes.Player(game, 0, playerFile)
+    if not player.ready:
+        return player.errorMsg or "Error! Failed to load the agent"
+
+    if not player.trained and game.train(player) is None:
+        return game.game_messages[0] or "Error! Failed to train the agent"
+
+    return ''
+
+
+# Whether an agent has a trainingSchedule; agents that fail to import are left to
+# fail in their games
+def has_training_schedule(playerFile):
+    try:
+        return getattr(importlib.import_module(playerFile[:-3]), 'trainingSchedule', None) is not None
+    except (Exception, SystemExit):
+        return False
+
+
+# Play a game between two agents; returns the score of the first and the error
+# messages of both
+def play_tournament_game(settings, playerFiles, seed):
+    game = tournament_game(settings, seed)
+
+    players = []
+    for k, playerFile in enumerate(playerFiles):
+        players.append(snakes.Player(game, k, playerFile))
+        if not players[-1].ready:
+            game.game_messages[k] = players[-1].errorMsg or "Error! Failed to load the agent"
+
+    if game.game_messages[0] or game.game_messages[1]:
+        return None, game.game_messages
+
+    try:
+        for player in players:
+            if game.sandboxAgents:
+                player.sandbox = snakes.AgentSandbox(player)
+
+        score = game.engine(game, None, False, seeds=[game.seeds]).play(players)
+    finally:
+        for player in players:
+            if player.sandbox is not None:
+                player.sandbox.close()
+
+    if score is None:
+        return None, game.game_messages
+
+    return score, game.game_messages
+
+
+# Play the tournament; returns the standings and the results of the games
+def play_tournament(agentPath, settings, nGames, nWorkers, seed):
+    agentPath = os.path.abspath(agentPath)
+    playerFiles = agent_files(agentPath)
+    names = [playerFile[:-3] for playerFile in playerFiles]
+
+    rnd = np.random.RandomState(seed)
+
+    standings = dict()
+    for name in names:
+        standings[name] = dict(player=name, games=0, wins=0, draws=0, losses=0, points=0, score=0, errors=0, messages=[])
+
+    with ProcessPoolExecutor(nWorkers, initializer=enter_folder, initargs=(agentPath,)) as pool:
+
+        # Train the agents that have a trainingSchedule and no saved population
+        unsaved = [playerFile for playerFile in playerFiles
+                   if not os.path.exists(os.path.join(agentPath, playerFile[:-3] + '.tar.gz'))]
+        untrained = [playerFile for playerFile, schedule in zip(unsaved, pool.map(has_training_schedule, unsaved)) if schedule]
+        if len(untrained) > 0:
+            print("Training %d agents..." % len(untrained))
+            jobs = {pool.submit(train_agent, settings, playerFile, rnd.randint(2**31)): playerFile for playerFile in untrained}
+            for job in as_completed(jobs):
+                try:
+                    message = job.result()
+                except (Exception, SystemExit) as e:
+                    message = "Error! The training process failed - %s" % repr(e)
+                if message:
+                    standings[jobs[job][:-3]]['messages'].append(message)
+
+        # Play every pair of agents nGames times, swapping sides after each game
+        pairs = [(a, b) for a in range(len(playerFiles)) for b in range(a+1, len(playerFiles))]
+        jobs = dict()
+        for a, b in pairs:
+            for n in range(nGames):
+                first, second = (a, b) if n % 2 == 0 else (b, a)
+                gameSeed = rnd.randint(2**31)
+                jobs[pool.submit(play_tournament_game, settings, (playerFiles[first], playerFiles[second]), gameSeed)] = (first, second, gameSeed)
+
+        print("Playing %d games between %d agents..." % (len(jobs), len(playerFiles)))
+
+        results = []
+        for done, job in enumerate(as_completed(jobs)):
+            a, b, gameSeed = jobs[job]
+            try:
+                score, messages = job.result()
+            except (Exception, SystemExit) as e:
+                score, messages = None, ["Error! The game process failed - %s" % repr(e)] * 2
+
+            results.append(dict(player1=names[a], player2=names[b], seed=gameSeed, score=score,
+                                message1=messages[0], message2=messages[1]))
+
+            # A player whose agents fail loses the game
+            if score is not None:
+                outcome = np.sign(score)
+            elif messages[0] and not messages[1]:
+                outcome = -1
+            elif messages[1] and not messages[0]:
+                outcome = 1
+            else:
+                outcome = None
+            outcomes = {1: ['wins', 'losses'], -1: ['losses', 'wins'], 0: ['draws', 'draws'], None: ['losses', 'losses']}[outcome]
+
+            for k, (player, sign) in enumerate(zip((names[a], names[b]), (1, -1))):
+                entry = standings[player]
+                entry['games'] += 1
+                entry[outcomes[k]] += 1
+                if score is not None:
+                    entry['score'] += sign*score
+                if messages[k]:
+                    entry['errors'] += 1
+                    entry['messages'].append(messages[k])
+
+            if (done+1) % 100 == 0:
+                print("  %d/%d games" % (done+1, len(jobs)))
+
+    for entry in standings.values():
+        entry['points'] = 3*entry['wins'] + entry['draws']
+
+    standings = sorted(standings.values(), key=lambda entry: (entry['points'], entry['score']), reverse=True)
+    return standings, results
+
+
+# Write the standings and, next to them, the results of the games
+def save_tournament(resultsFile, standings, results):
+    with open(resultsFile, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'player', 'games', 'wins', 'draws', 'losses', 'points', 'score', 'errors', 'messages'])
+        for rank, entry in enumerate(standings):
+            writer.writerow([rank+1, entry['player'], entry['games'], entry['wins'], entry['draws'], entry['losses'],
+                             entry['points'], entry['score'], entry['errors'], " | ".join(sorted(set(entry['messages'])))])
+
+    gamesFile = os.path.splitext(resultsFile)[0] + '_games.csv'
+    with open(gamesFile, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['player1', 'player2', 'seed', 'score', 'message1', 'message2'])
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main(argv):
+    # Load the defaults
+    from settings import game_settings
+
+    # Check of arguments from command line
+    try:
+        opts, args = getopt.getopt(argv, "a:n:w:o:", ["agents=", "games=", "workers=", "out="])
+    except getopt.GetoptError:
+        print("Error! Invalid argument.")
+        sys.exit(2)
+
+    agentPath = "tournament"
+    nGames = 4
+    nWorkers = os.cpu_count()
+    resultsFile = "tournament.csv"
+    for opt, arg in opts:
+        if opt in ("-a", "--agents"):
+            agentPath = arg
+        elif opt in ("-n", "--games"):
+            nGames = int(arg)
+        elif opt in ("-w", "--workers"):
+            nWorkers = int(arg)
+        elif opt in ("-o", "--out"):
+            resultsFile = arg
+
+    if not os.path.isdir(agentPath):
+        print("Error! Agent folder '%s' not found." % agentPath)
+        sys.exit(-1)
+
+    if len(agent_files(agentPath)) < 2:
+        print("Error! The tournament needs at least two agents in '%s'." % agentPath)
+        sys.exit(-1)
+
+    if nGames < 1 or nWorkers < 1:
+        print("Error! The number of games per pair and the number of workers must be at least 1.")
+        sys.exit(-1)
+
+    if game_settings['sandboxAgents'] and game_settings['engine'] not in ['arrays', 'tiles']:
+        print("Error! Sandboxed agents need the 'arrays' or 'tiles' engine, where the snakes of both players perceive the start of the turn")
+        sys.exit(-1)
+
+    settings = dict(gridSize=game_settings['gridSize'],
+                    nTurns=game_settings['nTurns'], nFoods=game_settings['nSnakes'],
+                    nAgents=game_settings['nSnakes'],
+                    engine=game_settings['engine'],
+                    nTiles=game_settings['nTiles'],
+                    trainingGames=game_settings['trainingGames'],
+                    sandboxAgents=game_settings['sandboxAgents'])
+
+    standings, results = play_tournament(agentPath, settings, nGames, nWorkers, game_settings['seed'])
+    save_tournament(resultsFile, standings, results)
+
+    print("\n%4s %-20s %6s %5s %5s %5s %6s %6s" % ("rank", "player", "games", "won", "drew", "lost", "points", "score"))
+    for rank, entry in enumerate(standings):
+        print("%4d %-20s %6d %5d %5d %5d %6d %6d" % (rank+1, entry['player'], entry['games'], entry['wins'],
+                                                   entry['draws'], entry['losses'], entry['points'], entry['score']))
+    print("\nResults saved to %s" % resultsFile)
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])